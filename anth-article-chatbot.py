@@ -1,37 +1,94 @@
-from langchain_anthropic import ChatAnthropic
-from langchain_core.prompts import PromptTemplate
-from langchain_core.output_parsers import JsonOutputParser
+from langchain_core.prompts import PromptTemplate, ChatPromptTemplate
+from langchain_core.messages import SystemMessage
 from langchain_core.runnables import RunnableSequence
-from langchain_community.chat_message_histories import ChatMessageHistory
-import json
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, Future
 from dotenv import load_dotenv
-from typing import Dict, List, Any
+from pydantic import BaseModel, Field
+from typing import Dict, List, Any, Literal, Optional, Tuple
+
+from bot_src.backends import create_chat_model, get_backend, require_api_key
+from bot_src.llm_cache import get_response_cache
+from bot_src.callbacks import StageStats
+from bot_src.metrics import stage_config
+from bot_src.structured import StructuredCaller
+from bot_src.history import MessageStore, HistoryCompactor, ChatRecord
 
 # Load environment variables from .env file
 load_dotenv()
 
-# Verify API key is available
-if not os.getenv("ANTHROPIC_API_KEY"):
-    raise ValueError("ANTHROPIC_API_KEY not found in environment variables")
+# Verify API key is available for the selected backend
+BACKEND = get_backend("anthropic")
+require_api_key(BACKEND)
+
+# Shared by every bot for speculative stage calls (the assessment plus the critical-thinking stage)
+_speculation_executor = ThreadPoolExecutor(max_workers=6, thread_name_prefix="speculative-stage")
+
+class Scores(BaseModel):
+    concept: int = Field(ge=0, le=5, description="키워드 파악 여부 (0-5)")
+    main_points: int = Field(ge=0, le=5, description="핵심 개념 이해 정도 (0-5)")
+    explanation: int = Field(ge=0, le=5, description="주요 논점 파악 (0-5)")
+
+class Assessment(BaseModel):
+    """학생 답변에 대한 이해도 평가"""
+    scores: Scores
+    total: int = Field(description="세 점수의 합")
+    feedback: str = Field(description="구체적인 피드백")
+    areas_for_improvement: List[str] = Field(default_factory=list, description="보완이 필요한 부분")
+    remedial_questions: List[str] = Field(
+        default_factory=list,
+        description="총점이 기준 점수 미만일 때만, 보완이 필요한 부분의 이해를 돕는 추가 질문 2-3개"
+    )
+
+class QualityCheck(BaseModel):
+    """답변이 질문의 의도를 반영했는지에 대한 평가"""
+    quality: Literal["sufficient", "out-of-context"]
+    feedback: str
+    suggested_followup: Optional[str] = Field(default=None, description="out-of-context일 때 이어서 할 질문")
 
 class ArticleUnderstandingBot:
-    def __init__(self, article_text: str, min_score: int = 10):
-        self.llm = ChatAnthropic(
+    def __init__(self, article_text: str, min_score: int = 10, speculative: bool = False,
+                 transcript_token_budget: int = 2000, keep_recent_exchanges: int = 2):
+        # LLM_BACKEND=fake runs the whole flow offline (see bot_src/backends.py)
+        self.llm = create_chat_model(
+            BACKEND,
             temperature=0.7,
-            api_key=os.getenv("ANTHROPIC_API_KEY"),
-            model="claude-3-5-sonnet-20241022" 
+            cache=get_response_cache()
         )
         self.article = article_text
-        self.chat_history = ChatMessageHistory()
+        # Tutor questions (assistant) and student answers (user), condensed in
+        # the background so synthesis gets a bounded transcript
+        self.transcript = MessageStore()
+        self.compactor = HistoryCompactor(
+            self.transcript,
+            self._summarize_transcript,
+            token_budget=transcript_token_budget,
+            keep_recent_turns=keep_recent_exchanges
+        )
         self.min_score = min_score
+        self.stats = StageStats()
+        self.structured = StructuredCaller()
+        
+        # Speculative mode generates the critical-thinking questions while the
+        # answer is assessed, trading tokens (if they go unused) for latency
+        self.speculative = speculative
+        self.speculation = {"rounds": 0, "seconds_saved": 0.0, "discarded_calls": 0, "discarded_output_tokens": 0}
+        self._speculation_lock = threading.Lock()
+        self._prepared_critical: Optional[Tuple[str, Future]] = None
+        
+        # The article is sent once per session as a cached system prefix;
+        # every stage prompt below only adds its own instructions after it
+        self.article_message = SystemMessage(content=[{
+            "type": "text",
+            "text": f"학생과 함께 읽고 있는 글입니다:\n\n<article>\n{article_text}\n</article>",
+            "cache_control": {"type": "ephemeral"}
+        }])
         
         # Stage 1: Initial Understanding Assessment
-        self.initial_questions_prompt = PromptTemplate(
-            input_variables=["article"],
-            template="""
-            다음 글에 대한 기본적인 이해를 평가하기 위한 3가지 핵심 질문을 생성해주세요:
-            {article}
+        self.initial_questions_prompt = self._with_article("""
+            위 글에 대한 기본적인 이해를 평가하기 위한 3가지 핵심 질문을 생성해주세요.
             
             각각의 질문은 다음을 평가할 수 있어야 합니다:
             1. 키워드 파악 여부 (단답형 문항항)
@@ -39,58 +96,39 @@ class ArticleUnderstandingBot:
             2. 주요 논점 파악
 
             설명 없이 질문만, 번호를 매겨서 제시해 주세요.
-            """
-        )
+            """)
         
-        self.assessment_prompt = PromptTemplate(
-            input_variables=["article", "questions", "response"],
-            template="""
-            다음 답변을 평가해주세요:
+        self.assessment_prompt = self._with_article("""
+            위 글에 대한 다음 답변을 평가해주세요:
             
-            원문: {article}
             질문: {questions}
             답변: {response}
             
             각 항목을 0-5점으로 평가하고, 구체적인 피드백을 제공해주세요:
             1. 키워드 파악 여부
             2. 핵심 개념 이해 정도
-            3. 주요 논점 파악악
+            3. 주요 논점 파악
             
-            JSON 형식으로 반환:
-            {{
-                "scores": {{
-                    "concept": int,
-                    "main_points": int,
-                    "explanation": int
-                }},
-                "total": int,
-                "feedback": str,
-                "areas_for_improvement": List[str]
-            }}
-            """
-        )
+            총점이 {min_score}점 미만이면, 보완이 필요한 부분의 이해를 돕기 위한 구체적인 추가 질문을
+            2-3개 remedial_questions에 적어주세요. {min_score}점 이상이면 remedial_questions는 비워두세요.
+            
+            평가 결과는 Assessment 형식으로 반환해주세요.
+            """)
         
-        # Remedial Learning
-        self.remedial_prompt = PromptTemplate(
-            input_variables=["article", "areas_for_improvement"],
-            template="""
-            다음 부족한 부분들에 대한 이해를 돕기 위한 추가 질문을 2-3개 생성해주세요:
+        # Remedial Learning, for assessments that came back without remedial questions
+        self.remedial_prompt = self._with_article("""
+            위 글에서 학생이 부족한 다음 부분들에 대한 이해를 돕기 위한 추가 질문을 2-3개 생성해주세요:
             
-            원문: {article}
             부족한 부분: {areas_for_improvement}
             
             질문은 구체적이고 학생의 이해를 돕는 방향이어야 합니다.
             질문을 명확하게 번호를 매겨서 제시해주세요.
-            """
-        )
+            """)
         
         # Stage 2: Critical Thinking
-        self.critical_prompt = PromptTemplate(
-            input_variables=["article", "response"],
-            template="""
-            학생의 답변을 바탕으로 비판적 사고를 위한 심층 질문을 생성해주세요:
+        self.critical_prompt = self._with_article("""
+            위 글에 대한 학생의 답변을 바탕으로 비판적 사고를 위한 심층 질문을 생성해주세요:
             
-            원문: {article}
             학생 답변: {response}
             
             다음 영역에서 1-2개의 질문을 생성해주세요:
@@ -100,8 +138,7 @@ class ArticleUnderstandingBot:
             4. 잠재적 한계점
             
             질문을 명확하게 번호를 매겨서 제시해주세요.
-            """
-        )
+            """)
         
         # Response Quality Check
         self.quality_check_prompt = PromptTemplate(
@@ -112,23 +149,24 @@ class ArticleUnderstandingBot:
             질문: {question}
             답변: {response}
             
-            JSON 형식으로 반환:
-            {{
-                "quality": "sufficient" 또는 "out-of-context",
-                "feedback": str,
-                "suggested_followup": str if out-of-context else null
-            }}
+            평가 결과는 QualityCheck 형식으로 반환해주세요.
+            질문의 의도를 벗어난 답변이면 quality를 "out-of-context"로 하고 suggested_followup에 이어서 할 질문을 적어주세요.
             """
         )
         
+        # Running summary of older exchanges, so synthesis input stays bounded
+        self.transcript_summary_prompt = ChatPromptTemplate.from_messages([
+            ("system", "글을 함께 읽는 튜터와 학생의 대화를 간결하게 요약해 관리합니다."),
+            ("human", "아래 기존 요약에 새 대화 내용을 반영해 요약을 갱신해주세요. "
+                      "튜터가 한 질문, 학생의 답변과 이해 수준, 남은 쟁점을 유지하고 간결하게 작성해주세요."
+                      "\n\n기존 요약:\n{summary}\n\n새 대화:\n{conversation}")
+        ])
+        
         # Stage 3: Final Synthesis
-        self.synthesis_prompt = PromptTemplate(
-            input_variables=["article", "conversation_history"],
-            template="""
-            전체 대화를 바탕으로 다음 구조에 따라 최종 정리를 작성할 수 있도록 안내해주세요.
+        self.synthesis_prompt = self._with_article("""
+            위 글에 대한 전체 대화를 바탕으로 다음 구조에 따라 최종 정리를 작성할 수 있도록 안내해주세요.
             이때 구체적인 내용은 작성하지 말고, 구조만 제시해주세요.
             
-            원문: {article}
             대화 내용: {conversation_history}
             
             [최종 정리를 위한 구조]
@@ -145,32 +183,171 @@ class ArticleUnderstandingBot:
             - 근거는 어떻게 제시해야 하는지
 
             각 항목별로 2-3개의 구체적인 가이드라인을 제시해주세요.
-            """
+            """)
+
+    def _with_article(self, template: str) -> ChatPromptTemplate:
+        """Stage prompt: the shared article prefix followed by stage instructions"""
+        return ChatPromptTemplate.from_messages([self.article_message, ("human", template)])
+
+    def _call(self, stage: str, prompt, inputs: Dict[str, Any]) -> Tuple[str, float, Optional[Dict[str, Any]]]:
+        """Run one stage prompt; returns the text, seconds taken and token usage"""
+        start = time.perf_counter()
+        message = (prompt | self.llm).invoke(inputs, config=stage_config(stage))
+        content = message.content if hasattr(message, 'content') else str(message)
+        return content, time.perf_counter() - start, getattr(message, "usage_metadata", None)
+
+    def _call_structured(self, stage: str, prompt, schema, inputs: Dict[str, Any]) -> Tuple[Dict[str, Any], float, Optional[Dict[str, Any]]]:
+        """Like _call, for a reply parsed into `schema`
+
+        The schema is sent as a tool, and tools come before the system
+        prompt in Anthropic's cache prefix, so these calls cannot read the
+        article cached by the plain stages: the first call per schema writes
+        its own cached copy of the article (the `written` column of the
+        stats report) and later calls with that schema read it.
+        """
+        start = time.perf_counter()
+        result, usage = self.structured.invoke(stage, prompt, self.llm, schema, inputs)
+        return result, time.perf_counter() - start, usage
+
+    def _invoke(self, stage: str, prompt, inputs: Dict[str, Any]) -> str:
+        """Run one stage prompt, recording its latency and token usage"""
+        content, seconds, usage = self._call(stage, prompt, inputs)
+        self.stats.record(stage, seconds, usage)
+        return content
+
+    def _use(self, stage: str, future: Future) -> Tuple[str, float]:
+        """Wait for a speculative call whose result is needed and record it"""
+        content, seconds, usage = future.result()
+        self.stats.record(stage, seconds, usage)
+        return content, seconds
+
+    def _use_prepared(self, stage: str, future: Future) -> str:
+        """Use a speculatively generated next stage, logging the time saved
+
+        Run serially, the call would have started only now and taken its full
+        duration; with speculation the student waits only for what is left.
+        """
+        start = time.perf_counter()
+        content, seconds = self._use(stage, future)
+        self._record_saving(stage, seconds, time.perf_counter() - start)
+        return content
+
+    def _discard(self, stage: str, future: Future) -> None:
+        """Drop a speculative call that turned out not to be needed"""
+        if future.cancel():
+            return
+
+        def record(done: Future):
+            if done.exception() is not None:
+                return
+            _, seconds, usage = done.result()
+            self.stats.record(f"{stage} (discarded)", seconds, usage)
+            with self._speculation_lock:
+                self.speculation["discarded_calls"] += 1
+                self.speculation["discarded_output_tokens"] += (usage or {}).get("output_tokens", 0)
+
+        # A request already in flight cannot be aborted; count its tokens when it ends
+        future.add_done_callback(record)
+
+    def _record_saving(self, label: str, serial_seconds: float, wall_seconds: float) -> None:
+        saved = max(serial_seconds - wall_seconds, 0.0)
+        with self._speculation_lock:
+            self.speculation["rounds"] += 1
+            self.speculation["seconds_saved"] += saved
+        print(f"[speculative] {label}: waited {wall_seconds:.2f}s instead of {serial_seconds:.2f}s, saved {saved:.2f}s")
+
+    def discard_speculation(self) -> None:
+        """Drop critical-thinking questions generated speculatively but never used"""
+        if self._prepared_critical is not None:
+            self._discard("generate_critical_questions", self._prepared_critical[1])
+            self._prepared_critical = None
+
+    def speculation_summary(self) -> str:
+        """Wall-clock saved and tokens spent on discarded branches this session"""
+        with self._speculation_lock:
+            s = dict(self.speculation)
+        return (
+            f"{s['rounds']} speculative rounds saved {s['seconds_saved']:.2f}s; "
+            f"{s['discarded_calls']} discarded calls used {s['discarded_output_tokens']} output tokens"
+        )
+
+    def record_exchange(self, questions: str, answer: str) -> None:
+        """Add the tutor's questions and the student's answer to the transcript"""
+        self.transcript.append("assistant", questions)
+        self.transcript.append("user", answer)
+        self.compactor.maybe_compact()
+
+    def _summarize_transcript(self, previous_summary: Optional[str], records: List[ChatRecord]) -> str:
+        """Fold older exchanges into the running summary"""
+        conversation = "\n".join(
+            f"{'학생' if r.role == 'user' else '튜터'}: {r.content}" for r in records
+        )
+        return self._invoke("summarize_transcript", self.transcript_summary_prompt, {
+            "summary": previous_summary or "(없음)",
+            "conversation": conversation
+        })
+
+    def condensed_transcript(self) -> str:
+        """Running summary of earlier exchanges followed by the recent ones"""
+        # One read, so a fold on the compactor thread can't split start and summary
+        start, summary = self.transcript.window()
+        lines = [f"[이전 대화 요약]\n{summary}"] if summary else []
+        lines.extend(
+            f"{'학생' if r.role == 'user' else '튜터'}: {r.content}"
+            for r in self.transcript.records(start, len(self.transcript))
         )
+        return "\n\n".join(lines)
 
     def start_initial_assessment(self) -> Dict[str, Any]:
         """Stage 1: Generate initial questions and start assessment"""
-        chain = self.initial_questions_prompt | self.llm
-        questions_message = chain.invoke({"article": self.article})
-        questions = questions_message.content if hasattr(questions_message, 'content') else str(questions_message)
+        questions = self._invoke("initial_questions", self.initial_questions_prompt, {})
         return {"questions": questions}
     
     def assess_understanding(self, questions: str, response: str) -> Dict[str, Any]:
-        """Evaluate student's understanding and determine next steps"""
-        assess_chain = self.assessment_prompt | self.llm
-        result_message = assess_chain.invoke({
-            "article": self.article,
-            "questions": questions,
-            "response": response
-        })
-        result = result_message.content if hasattr(result_message, 'content') else str(result_message)
-        assessment = json.loads(result)
-        
+        """Evaluate student's understanding and determine next steps
+
+        Below min_score the same call also returns the remedial questions,
+        so the remedial loop needs one round trip per answer instead of two.
+        """
+        inputs = {"questions": questions, "response": response, "min_score": self.min_score}
+        if self.speculative:
+            return self._assess_speculatively(inputs)
+        result, seconds, usage = self._call_structured("assess_understanding", self.assessment_prompt, Assessment, inputs)
+        self.stats.record("assess_understanding", seconds, usage)
+        return self._parse_assessment(result)
+
+    def _assess_speculatively(self, inputs: Dict[str, Any]) -> Dict[str, Any]:
+        """Assess while already generating the critical-thinking questions
+
+        Remedial questions come with the assessment itself, so only the
+        critical branch is speculative. It is generated from the first answer
+        of the session, as in the serial flow, and kept for
+        generate_critical_questions.
+        """
+        assessment_future = _speculation_executor.submit(
+            self._call_structured, "assess_understanding", self.assessment_prompt, Assessment, inputs
+        )
+        if self._prepared_critical is None:
+            critical_future = _speculation_executor.submit(
+                self._call, "generate_critical_questions", self.critical_prompt, {"response": inputs["response"]}
+            )
+            self._prepared_critical = (inputs["response"], critical_future)
+
+        result, _ = self._use("assess_understanding", assessment_future)
+        return self._parse_assessment(result)
+
+    def _parse_assessment(self, assessment: Dict[str, Any]) -> Dict[str, Any]:
+        needs_remedial = assessment["total"] < self.min_score
+        remedial_questions = assessment.get("remedial_questions") or []
         return {
-            "status": "needs_remedial" if assessment["total"] < self.min_score else "ready_for_critical",
+            "status": "needs_remedial" if needs_remedial else "ready_for_critical",
             "score": assessment["total"],
             "feedback": assessment["feedback"],
-            "areas_for_improvement": assessment.get("areas_for_improvement", [])
+            "areas_for_improvement": assessment.get("areas_for_improvement", []),
+            "remedial_questions": (
+                "\n".join(f"{i}. {question}" for i, question in enumerate(remedial_questions, 1))
+                if needs_remedial and remedial_questions else None
+            )
         }
 
     def handle_remedial_learning(self, initial_assessment: Dict[str, Any]) -> Dict[str, Any]:
@@ -183,13 +360,13 @@ class ArticleUnderstandingBot:
             print(f"\n=== 평가 결과 (점수: {current_assessment['score']}) ===")
             print(f"피드백: {current_assessment['feedback']}")
             
-            # Generate remedial questions
-            remedial_chain = self.remedial_prompt | self.llm
-            remedial_message = remedial_chain.invoke({
-                "article": self.article,
-                "areas_for_improvement": current_assessment["areas_for_improvement"]
-            })
-            remedial_questions = remedial_message.content
+            # Remedial questions normally come with the assessment; generate
+            # them separately only if the model left them out
+            remedial_questions = current_assessment.get("remedial_questions")
+            if not remedial_questions:
+                remedial_questions = self._invoke("remedial_questions", self.remedial_prompt, {
+                    "areas_for_improvement": current_assessment["areas_for_improvement"]
+                })
             
             print("\n=== 추가 질문 ===")
             print(remedial_questions)
@@ -198,9 +375,7 @@ class ArticleUnderstandingBot:
             print("\n추가 질문에 대한 답변을 입력해주세요 (완료하려면 Enter 두 번):")
             remedial_response = get_multiline_input()
             
-            # Add to chat history
-            self.chat_history.add_user_message(remedial_questions)
-            self.chat_history.add_ai_message(remedial_response)
+            self.record_exchange(remedial_questions, remedial_response)
             
             # Reassess understanding
             current_assessment = self.assess_understanding(remedial_questions, remedial_response)
@@ -213,22 +388,24 @@ class ArticleUnderstandingBot:
 
     def generate_critical_questions(self, response: str) -> str:
         """Stage 2: Generate critical thinking questions"""
-        chain = self.critical_prompt | self.llm
-        message = chain.invoke({
-            "article": self.article,
+        if self._prepared_critical is not None:
+            prepared_response, future = self._prepared_critical
+            self._prepared_critical = None
+            if prepared_response == response:
+                return self._use_prepared("generate_critical_questions", future)
+            self._discard("generate_critical_questions", future)
+        return self._invoke("generate_critical_questions", self.critical_prompt, {
             "response": response
         })
-        return message.content if hasattr(message, 'content') else str(message)
     
     def check_response_quality(self, question: str, response: str) -> Dict[str, Any]:
         """Evaluate the quality of student's critical thinking response"""
-        chain = self.quality_check_prompt | self.llm
-        message = chain.invoke({
+        result, seconds, usage = self._call_structured("check_response_quality", self.quality_check_prompt, QualityCheck, {
             "question": question,
             "response": response
         })
-        result = message.content if hasattr(message, 'content') else str(message)
-        return json.loads(result)
+        self.stats.record("check_response_quality", seconds, usage)
+        return result
 
     def handle_critical_thinking(self, response: str) -> None:
         """Handle critical thinking stage with follow-up questions"""
@@ -240,16 +417,11 @@ class ArticleUnderstandingBot:
         print("\n=== 심층 분석 질문 ===")
         print(critical_questions)
         
-        # Add initial response to chat history
-        self.chat_history.add_user_message("Initial response: " + response)
-        
         while followup_count < max_followups:
             print("\n답변을 입력해주세요 (완료하려면 Enter 두 번):")
             critical_response = get_multiline_input()
             
-            # Add to chat history
-            self.chat_history.add_user_message(critical_questions)
-            self.chat_history.add_ai_message(critical_response)
+            self.record_exchange(critical_questions, critical_response)
             
             # Check response quality
             quality_check = self.check_response_quality(critical_questions, critical_response)
@@ -269,14 +441,10 @@ class ArticleUnderstandingBot:
     
     def guide_synthesis(self) -> str:
         """Stage 3: Guide final synthesis"""
-        chain = self.synthesis_prompt | self.llm
-        messages = self.chat_history.messages
-        conversation_history = "\n".join([msg.content for msg in messages])
-        message = chain.invoke({
-            "article": self.article,
-            "conversation_history": conversation_history
+        self.discard_speculation()
+        return self._invoke("guide_synthesis", self.synthesis_prompt, {
+            "conversation_history": self.condensed_transcript()
         })
-        return message.content if hasattr(message, 'content') else str(message)
 
 def get_multiline_input() -> str:
     """Helper function to get multiline input from user"""
@@ -320,7 +488,7 @@ def main():
         return
         
     print("\nStarting discussion about the article...")
-    bot = ArticleUnderstandingBot(article)
+    bot = ArticleUnderstandingBot(article, speculative=os.getenv("SPECULATIVE_STAGES", "0") == "1")
     
     # Stage 1: Initial Assessment
     initial = bot.start_initial_assessment()
@@ -335,6 +503,8 @@ def main():
         print("Error: Response cannot be empty. Please provide your thoughts about the article.")
         return
         
+    bot.record_exchange(initial["questions"], response)
+    
     # Initial assessment and handle remedial if needed
     assessment = bot.assess_understanding(initial["questions"], response)
     
@@ -352,6 +522,12 @@ def main():
     print("\n=== 최종 정리 가이드 ===")
     synthesis_guide = bot.guide_synthesis()
     print(synthesis_guide)
+    
+    print("\n=== 단계별 응답 시간 및 캐시 사용량 ===")
+    print(bot.stats.report())
+    print(bot.structured.report())
+    if bot.speculative:
+        print(bot.speculation_summary())
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,92 +1,112 @@
-from langchain_openai import ChatOpenAI
-from langchain_core.prompts import PromptTemplate
-from langchain_core.output_parsers import JsonOutputParser
+from langchain_core.prompts import PromptTemplate, ChatPromptTemplate
+from langchain_core.messages import SystemMessage
 from langchain_core.runnables import RunnableSequence
-from langchain_community.chat_message_histories import ChatMessageHistory
-import json
-import os
+import time
 from dotenv import load_dotenv
-from typing import Dict, List, Any
+from pydantic import BaseModel, Field
+from typing import Dict, List, Any, Literal, Optional
+
+from bot_src.backends import create_chat_model, get_backend, require_api_key
+from bot_src.llm_cache import get_response_cache
+from bot_src.callbacks import StageStats
+from bot_src.metrics import stage_config
+from bot_src.structured import StructuredCaller
+from bot_src.history import MessageStore, HistoryCompactor, ChatRecord
 
 # Load environment variables from .env file
 load_dotenv()
 
-# Verify API key is available
-if not os.getenv("OPENAI_API_KEY"):
-    raise ValueError("OPENAI_API_KEY not found in environment variables")
+# Verify API key is available for the selected backend
+BACKEND = get_backend("openai")
+require_api_key(BACKEND)
+
+class Scores(BaseModel):
+    concept: int = Field(ge=0, le=5, description="핵심 개념 이해 (0-5)")
+    main_points: int = Field(ge=0, le=5, description="주요 논점 파악 (0-5)")
+    explanation: int = Field(ge=0, le=5, description="논리적 설명 능력 (0-5)")
+
+class Assessment(BaseModel):
+    """학생 답변에 대한 이해도 평가"""
+    scores: Scores
+    total: int = Field(description="세 점수의 합")
+    feedback: str = Field(description="평가 피드백")
+    areas_for_improvement: List[str] = Field(default_factory=list, description="개선점")
+    remedial_questions: List[str] = Field(
+        default_factory=list,
+        description="총점이 기준 점수 미만일 때만, 부족한 부분의 이해를 돕는 추가 질문 2-3개"
+    )
+
+class QualityCheck(BaseModel):
+    """답변의 깊이와 품질에 대한 평가"""
+    quality: Literal["sufficient", "needs_depth"]
+    feedback: str
+    suggested_followup: Optional[str] = Field(default=None, description="needs_depth일 때 이어서 할 질문")
 
 class ArticleUnderstandingBot:
-    def __init__(self, article_text: str, min_score: int = 10):
-        self.llm = ChatOpenAI(
+    def __init__(self, article_text: str, min_score: int = 10,
+                 transcript_token_budget: int = 2000, keep_recent_exchanges: int = 2):
+        # LLM_BACKEND=fake runs the whole flow offline (see bot_src/backends.py)
+        self.llm = create_chat_model(
+            BACKEND,
             temperature=0.7,
-            openai_api_key=os.getenv("OPENAI_API_KEY"),
-            model="gpt-4o"
+            cache=get_response_cache()
         )
         self.article = article_text
-        self.chat_history = ChatMessageHistory()
+        # Tutor questions (assistant) and student answers (user), condensed in
+        # the background so synthesis gets a bounded transcript
+        self.transcript = MessageStore()
+        self.compactor = HistoryCompactor(
+            self.transcript,
+            self._summarize_transcript,
+            token_budget=transcript_token_budget,
+            keep_recent_turns=keep_recent_exchanges
+        )
         self.min_score = min_score
+        self.stats = StageStats()
+        self.structured = StructuredCaller()
+        
+        # The article is sent once per session as the first, identical part of
+        # every prompt, so OpenAI's automatic prefix caching can reuse it
+        self.article_message = SystemMessage(
+            content=f"학생과 함께 읽고 있는 글입니다:\n\n<article>\n{article_text}\n</article>"
+        )
         
         # Stage 1: Initial Understanding Assessment
-        self.initial_questions_prompt = PromptTemplate(
-            input_variables=["article"],
-            template="""
-            다음 글에 대한 기본적인 이해를 평가하기 위한 3가지 핵심 질문을 생성해주세요:
-            {article}
+        self.initial_questions_prompt = self._with_article("""
+            위 글에 대한 기본적인 이해를 평가하기 위한 3가지 핵심 질문을 생성해주세요.
             
             질문은 다음을 평가할 수 있어야 합니다:
             1. 핵심 개념 이해도
             2. 주요 논점 파악
             3. 논리적 설명 능력
-            """
-        )
+            """)
         
-        self.assessment_prompt = PromptTemplate(
-            input_variables=["article", "questions", "response"],
-            template="""
-            다음 답변을 평가해주세요:
+        self.assessment_prompt = self._with_article("""
+            위 글에 대한 다음 답변을 평가해주세요:
             
-            원문: {article}
             질문: {questions}
             답변: {response}
             
-            각 항목을 0-5점으로 평가하고, 구체적인 피드백을 제공해주세요:
-            반드시 다음 JSON 형식으로만 응답해주세요:
-            {{
-                "scores": {{
-                    "concept": <0-5 사이 정수>,
-                    "main_points": <0-5 사이 정수>,
-                    "explanation": <0-5 사이 정수>
-                }},
-                "total": <총점>,
-                "feedback": "<평가 피드백>",
-                "areas_for_improvement": ["개선점1", "개선점2"]
-            }}
-            
-            다른 텍스트나 설명 없이 JSON만 반환해주세요.
-            """
-        )
+            각 항목을 0-5점으로 평가하고, 구체적인 피드백을 제공해주세요.
+            총점이 {min_score}점 미만이면, 부족한 부분의 이해를 돕기 위한 구체적인 추가 질문을
+            2-3개 remedial_questions에 적어주세요. {min_score}점 이상이면 remedial_questions는 비워두세요.
+            평가 결과는 Assessment 형식으로 반환해주세요.
+            """)
         
         # Remedial Learning
-        self.remedial_prompt = PromptTemplate(
-            input_variables=["article", "areas_for_improvement"],
-            template="""
-            다음 부족한 부분들에 대한 이해를 돕기 위한 추가 질문을 2-3개 생성해주세요:
+        self.remedial_prompt = self._with_article("""
+            위 글에서 학생이 부족한 다음 부분들에 대한 이해를 돕기 위한 추가 질문을 2-3개 생성해주세요:
             
-            원문: {article}
             부족한 부분: {areas_for_improvement}
             
             질문은 구체적이고 학생의 이해를 돕는 방향이어야 합니다.
             질문을 명확하게 번호를 매겨서 제시해주세요.
-            """
-        )
+            """)
         
         # Stage 2: Critical Thinking
-        self.critical_prompt = PromptTemplate(
-            input_variables=["article", "response"],
-            template="""
-            학생의 답변을 바탕으로 비판적 사고를 위한 심층 질문을 생성해주세요:
+        self.critical_prompt = self._with_article("""
+            위 글에 대한 학생의 답변을 바탕으로 비판적 사고를 위한 심층 질문을 생성해주세요:
             
-            원문: {article}
             학생 답변: {response}
             
             다음 영역에서 1-2개의 질문을 생성해주세요:
@@ -96,8 +116,7 @@ class ArticleUnderstandingBot:
             4. 잠재적 한계점
             
             질문을 명확하게 번호를 매겨서 제시해주세요.
-            """
-        )
+            """)
         
         # Response Quality Check
         self.quality_check_prompt = PromptTemplate(
@@ -108,23 +127,24 @@ class ArticleUnderstandingBot:
             질문: {question}
             답변: {response}
             
-            JSON 형식으로 반환:
-            {{
-                "quality": "sufficient" 또는 "needs_depth",
-                "feedback": str,
-                "suggested_followup": str if needs_depth else null
-            }}
+            평가 결과는 QualityCheck 형식으로 반환해주세요.
+            더 깊이 있는 답변이 필요하면 quality를 "needs_depth"로 하고 suggested_followup에 이어서 할 질문을 적어주세요.
             """
         )
         
+        # Running summary of older exchanges, so synthesis input stays bounded
+        self.transcript_summary_prompt = ChatPromptTemplate.from_messages([
+            ("system", "글을 함께 읽는 튜터와 학생의 대화를 간결하게 요약해 관리합니다."),
+            ("human", "아래 기존 요약에 새 대화 내용을 반영해 요약을 갱신해주세요. "
+                      "튜터가 한 질문, 학생의 답변과 이해 수준, 남은 쟁점을 유지하고 간결하게 작성해주세요."
+                      "\n\n기존 요약:\n{summary}\n\n새 대화:\n{conversation}")
+        ])
+        
         # Stage 3: Final Synthesis
-        self.synthesis_prompt = PromptTemplate(
-            input_variables=["article", "conversation_history"],
-            template="""
-            전체 대화를 바탕으로 다음 구조에 따라 최종 정리를 작성할 수 있도록 안내해주세요.
+        self.synthesis_prompt = self._with_article("""
+            위 글에 대한 전체 대화를 바탕으로 다음 구조에 따라 최종 정리를 작성할 수 있도록 안내해주세요.
             이때 구체적인 내용은 작성하지 말고, 구조만 제시해주세요.
             
-            원문: {article}
             대화 내용: {conversation_history}
             
             [최종 정리를 위한 구조]
@@ -141,33 +161,82 @@ class ArticleUnderstandingBot:
    - 근거는 어떻게 제시해야 하는지
 
 각 항목별로 2-3개의 구체적인 가이드라인을 제시해주세요.
-"""
+""")
+
+    def _with_article(self, template: str) -> ChatPromptTemplate:
+        """Stage prompt: the shared article prefix followed by stage instructions"""
+        return ChatPromptTemplate.from_messages([self.article_message, ("human", template)])
+
+    def _invoke_structured(self, stage: str, prompt, schema, inputs: Dict[str, Any]) -> Dict[str, Any]:
+        """Like _invoke, for a reply parsed into `schema`"""
+        start = time.perf_counter()
+        result, usage = self.structured.invoke(stage, prompt, self.llm, schema, inputs)
+        self.stats.record(stage, time.perf_counter() - start, usage)
+        return result
+
+    def _invoke(self, stage: str, prompt, inputs: Dict[str, Any]) -> str:
+        """Run one stage prompt, recording its latency and token usage"""
+        start = time.perf_counter()
+        message = (prompt | self.llm).invoke(inputs, config=stage_config(stage))
+        self.stats.record(stage, time.perf_counter() - start, getattr(message, "usage_metadata", None))
+        return message.content if hasattr(message, 'content') else str(message)
+
+    def record_exchange(self, questions: str, answer: str) -> None:
+        """Add the tutor's questions and the student's answer to the transcript"""
+        self.transcript.append("assistant", questions)
+        self.transcript.append("user", answer)
+        self.compactor.maybe_compact()
+
+    def _summarize_transcript(self, previous_summary: Optional[str], records: List[ChatRecord]) -> str:
+        """Fold older exchanges into the running summary"""
+        conversation = "\n".join(
+            f"{'학생' if r.role == 'user' else '튜터'}: {r.content}" for r in records
         )
+        return self._invoke("summarize_transcript", self.transcript_summary_prompt, {
+            "summary": previous_summary or "(없음)",
+            "conversation": conversation
+        })
+
+    def condensed_transcript(self) -> str:
+        """Running summary of earlier exchanges followed by the recent ones"""
+        # One read, so a fold on the compactor thread can't split start and summary
+        start, summary = self.transcript.window()
+        lines = [f"[이전 대화 요약]\n{summary}"] if summary else []
+        lines.extend(
+            f"{'학생' if r.role == 'user' else '튜터'}: {r.content}"
+            for r in self.transcript.records(start, len(self.transcript))
+        )
+        return "\n\n".join(lines)
 
     def start_initial_assessment(self) -> Dict[str, Any]:
         """Stage 1: Generate initial questions and start assessment"""
-        chain = self.initial_questions_prompt | self.llm
-        questions_message = chain.invoke({"article": self.article})
-        questions = questions_message.content if hasattr(questions_message, 'content') else str(questions_message)
+        questions = self._invoke("initial_questions", self.initial_questions_prompt, {})
         return {"questions": questions}
     
     def assess_understanding(self, questions: str, response: str) -> Dict[str, Any]:
-        """Evaluate student's understanding and determine next steps"""
-        output_parser = JsonOutputParser()
-        assess_chain = self.assessment_prompt | self.llm | output_parser
-    
+        """Evaluate student's understanding and determine next steps
+
+        Below min_score the same call also returns the remedial questions,
+        so the remedial loop needs one round trip per answer instead of two.
+        """
         try:
-            assessment = assess_chain.invoke({
-                "article": self.article,
+            assessment = self._invoke_structured("assess_understanding", self.assessment_prompt, Assessment, {
                 "questions": questions,
-                "response": response
+                "response": response,
+                "min_score": self.min_score
             })
+            needs_remedial = assessment["total"] < self.min_score
+            remedial_questions = assessment.get("remedial_questions") or []
         
             return {
-                "status": "needs_remedial" if assessment["total"] < self.min_score else "ready_for_critical",
+                "status": "needs_remedial" if needs_remedial else "ready_for_critical",
                 "score": assessment["total"],
                 "feedback": assessment["feedback"],
-                "areas_for_improvement": assessment.get("areas_for_improvement", [])
+                "areas_for_improvement": assessment.get("areas_for_improvement", []),
+                "remedial_questions": (
+                    "\n".join(f"{i}. {question}" for i, question in enumerate(remedial_questions, 1))
+                    if needs_remedial and remedial_questions else None
+                )
             }
         except Exception as e:
             print(f"Error parsing assessment: {e}")
@@ -188,13 +257,13 @@ class ArticleUnderstandingBot:
             print(f"\n=== 평가 결과 (점수: {current_assessment['score']}) ===")
             print(f"피드백: {current_assessment['feedback']}")
             
-            # Generate remedial questions
-            remedial_chain = self.remedial_prompt | self.llm
-            remedial_message = remedial_chain.invoke({
-                "article": self.article,
-                "areas_for_improvement": current_assessment["areas_for_improvement"]
-            })
-            remedial_questions = remedial_message.content
+            # Remedial questions normally come with the assessment; generate
+            # them separately only if the model left them out
+            remedial_questions = current_assessment.get("remedial_questions")
+            if not remedial_questions:
+                remedial_questions = self._invoke("remedial_questions", self.remedial_prompt, {
+                    "areas_for_improvement": current_assessment["areas_for_improvement"]
+                })
             
             print("\n=== 추가 질문 ===")
             print(remedial_questions)
@@ -203,9 +272,7 @@ class ArticleUnderstandingBot:
             print("\n추가 질문에 대한 답변을 입력해주세요 (완료하려면 Enter 두 번):")
             remedial_response = get_multiline_input()
             
-            # Add to chat history
-            self.chat_history.add_user_message(remedial_questions)
-            self.chat_history.add_ai_message(remedial_response)
+            self.record_exchange(remedial_questions, remedial_response)
             
             # Reassess understanding
             current_assessment = self.assess_understanding(remedial_questions, remedial_response)
@@ -218,22 +285,16 @@ class ArticleUnderstandingBot:
 
     def generate_critical_questions(self, response: str) -> str:
         """Stage 2: Generate critical thinking questions"""
-        chain = self.critical_prompt | self.llm
-        message = chain.invoke({
-            "article": self.article,
+        return self._invoke("generate_critical_questions", self.critical_prompt, {
             "response": response
         })
-        return message.content if hasattr(message, 'content') else str(message)
     
     def check_response_quality(self, question: str, response: str) -> Dict[str, Any]:
         """Evaluate the quality of student's critical thinking response"""
-        chain = self.quality_check_prompt | self.llm
-        message = chain.invoke({
+        return self._invoke_structured("check_response_quality", self.quality_check_prompt, QualityCheck, {
             "question": question,
             "response": response
         })
-        result = message.content if hasattr(message, 'content') else str(message)
-        return json.loads(result)
 
     def handle_critical_thinking(self, response: str) -> None:
         """Handle critical thinking stage with follow-up questions"""
@@ -245,16 +306,11 @@ class ArticleUnderstandingBot:
         print("\n=== 심층 분석 질문 ===")
         print(critical_questions)
         
-        # Add initial response to chat history
-        self.chat_history.add_user_message("Initial response: " + response)
-        
         while followup_count < max_followups:
             print("\n답변을 입력해주세요 (완료하려면 Enter 두 번):")
             critical_response = get_multiline_input()
             
-            # Add to chat history
-            self.chat_history.add_user_message(critical_questions)
-            self.chat_history.add_ai_message(critical_response)
+            self.record_exchange(critical_questions, critical_response)
             
             # Check response quality
             quality_check = self.check_response_quality(critical_questions, critical_response)
@@ -274,14 +330,9 @@ class ArticleUnderstandingBot:
     
     def guide_synthesis(self) -> str:
         """Stage 3: Guide final synthesis"""
-        chain = self.synthesis_prompt | self.llm
-        messages = self.chat_history.messages
-        conversation_history = "\n".join([msg.content for msg in messages])
-        message = chain.invoke({
-            "article": self.article,
-            "conversation_history": conversation_history
+        return self._invoke("guide_synthesis", self.synthesis_prompt, {
+            "conversation_history": self.condensed_transcript()
         })
-        return message.content if hasattr(message, 'content') else str(message)
 
 def get_multiline_input() -> str:
     """Helper function to get multiline input from user"""
@@ -345,6 +396,8 @@ def main():
         print("Error: Response cannot be empty. Please provide your thoughts about the article.")
         return
         
+    bot.record_exchange(initial["questions"], response)
+    
     # Initial assessment and handle remedial if needed
     assessment = bot.assess_understanding(initial["questions"], response)
     
@@ -362,6 +415,10 @@ def main():
     print("\n=== 최종 정리 가이드 ===")
     synthesis_guide = bot.guide_synthesis()
     print(synthesis_guide)
+    
+    print("\n=== 단계별 응답 시간 및 캐시 사용량 ===")
+    print(bot.stats.report())
+    print(bot.structured.report())
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,176 @@
+"""
+Precompute article text and TLDRs for a reading list
+
+    python batch_precompute.py readings/ --concurrency 4 --requests-per-minute 40
+
+For every PDF in the directory this extracts the text (into the same text
+store the app uses) and generates the TLDR (into the app's TLDR cache), so
+the app serves both without parsing or a model call. Results are also
+written to one JSON file per paper under --out. Completed stages are
+recorded as they finish, so rerunning after a crash only does what is left.
+"""
+import argparse
+import json
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict
+
+from dotenv import load_dotenv
+from langchain_core.rate_limiters import InMemoryRateLimiter
+
+from bot_src.backends import create_chat_model, get_backend
+from bot_src.bot import CuriousPeerBot
+from bot_src.chains import ChainFactory
+from bot_src.llm_cache import get_response_cache
+from bot_src.utils import read_pdf_pages, file_sha256, set_text_store
+from bot_src.text_store import TextStore
+from bot_src.tldr_cache import TLDRCache
+
+STAGES = ("extract", "tldr")
+
+
+class ResultStore:
+    """One JSON file per paper, rewritten atomically after every stage"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, digest: str) -> str:
+        return os.path.join(self.directory, f"{digest}.json")
+
+    def load(self, digest: str) -> Dict:
+        try:
+            with open(self._path(digest), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {"stages": {}}
+
+    def save(self, digest: str, record: Dict) -> None:
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(record, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self._path(digest))
+
+
+class BatchRunner:
+    def __init__(self, args):
+        self.args = args
+        self.results = ResultStore(args.out)
+        self.tldr_cache = TLDRCache(args.tldr_cache)
+        # One token bucket shared by every model call in every worker thread
+        self.rate_limiter = InMemoryRateLimiter(
+            requests_per_second=args.requests_per_minute / 60,
+            max_bucket_size=max(1, args.concurrency)
+        )
+        # TLDR bots share one client that waits on the bucket; the app's
+        # process-wide client is left without a limiter
+        backend = get_backend()
+        self.chains = ChainFactory(
+            chat_model=create_chat_model(
+                backend,
+                temperature=0.7,
+                max_tokens=4096,
+                cache=get_response_cache(),
+                rate_limiter=self.rate_limiter
+            ),
+            backend=backend
+        )
+        self.timings = {stage: [] for stage in STAGES}
+        self._lock = threading.Lock()
+
+    def _record_timing(self, stage: str, seconds: float):
+        with self._lock:
+            self.timings[stage].append(seconds)
+
+    def process(self, path: str) -> str:
+        """Run every stage not yet completed for one PDF; returns a status line"""
+        name = os.path.basename(path)
+        digest = file_sha256(path)
+        record = self.results.load(digest)
+        record["file"] = name
+        record["sha256"] = digest
+        done = record["stages"]
+        if all(stage in done for stage in STAGES):
+            return f"skip  {name} (already complete)"
+
+        start = time.perf_counter()
+        pages = read_pdf_pages(path, workers=self.args.pdf_workers, digest=digest)
+        text = "".join(pages)
+        if "extract" not in done:
+            done["extract"] = {"pages": len(pages), "seconds": time.perf_counter() - start}
+            self._record_timing("extract", done["extract"]["seconds"])
+            self.results.save(digest, record)
+
+        if "tldr" not in done:
+            start = time.perf_counter()
+            bot = CuriousPeerBot(chains=self.chains)
+            key = TLDRCache.make_key(digest, bot.model_name, bot.TLDR_PROMPT_VERSION)
+            tldr = self.tldr_cache.get(key)
+            if tldr is None:
+                tldr = bot.generate_tldr(text)
+                self.tldr_cache.put(key, tldr)
+            record["tldr"] = tldr
+            done["tldr"] = {"seconds": time.perf_counter() - start}
+            self._record_timing("tldr", done["tldr"]["seconds"])
+            self.results.save(digest, record)
+
+        return f"done  {name}"
+
+    def run(self, paths):
+        start = time.perf_counter()
+        completed = skipped = failed = 0
+        with ThreadPoolExecutor(max_workers=self.args.concurrency) as pool:
+            futures = {pool.submit(self.process, path): path for path in paths}
+            for future in as_completed(futures):
+                try:
+                    status = future.result()
+                    print(status)
+                    if status.startswith("skip"):
+                        skipped += 1
+                    else:
+                        completed += 1
+                except Exception as e:
+                    print(f"error {os.path.basename(futures[future])}: {e}")
+                    failed += 1
+        elapsed = time.perf_counter() - start
+
+        print(f"\n{completed} papers processed, {skipped} skipped, {failed} failed in {elapsed:.1f}s "
+              f"({completed / elapsed * 60 if elapsed else 0:.1f} papers/min)")
+        for stage, times in self.timings.items():
+            if times:
+                print(f"  {stage:<18} n={len(times):<4} mean={sum(times) / len(times):.2f}s max={max(times):.2f}s")
+
+
+def main():
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Precompute text and TLDRs for a directory of PDFs")
+    parser.add_argument("directory", help="directory containing the PDFs")
+    parser.add_argument("--out", default="_cache/batch", help="directory for per-paper JSON results")
+    parser.add_argument("--concurrency", type=int, default=4, help="papers processed at the same time")
+    parser.add_argument("--requests-per-minute", type=float, default=50, help="global limit on model calls")
+    parser.add_argument("--pdf-workers", type=int, default=1, help="processes per PDF extraction")
+    parser.add_argument("--tldr-cache", default=os.getenv("TLDR_CACHE_PATH", "_cache/tldr.sqlite3"))
+    parser.add_argument("--text-store", default=os.getenv("PDF_TEXT_STORE_DIR", "_cache/text"))
+    args = parser.parse_args()
+
+    paths = sorted(
+        os.path.join(args.directory, name)
+        for name in os.listdir(args.directory)
+        if name.lower().endswith(".pdf")
+    )
+    if not paths:
+        print(f"No PDF files found in {args.directory}")
+        return
+
+    set_text_store(TextStore(args.text_store))
+    runner = BatchRunner(args)
+    print(f"Processing {len(paths)} papers with concurrency {args.concurrency}")
+    runner.run(paths)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Per-turn history overhead: rebuild-every-turn vs. append-only MessageStore
+
+Run from the repository root:
+    python benchmarks/bench_history.py
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.messages import HumanMessage, AIMessage
+from bot_src.history import MessageStore
+
+TURNS = 400
+CHECKPOINTS = (10, 50, 100, 200, 400)
+
+
+def rebuild(chat_history):
+    """Old behaviour: convert the whole dict history on every turn"""
+    messages = []
+    for msg in chat_history:
+        if msg["role"] == "user":
+            messages.append(HumanMessage(content=msg["content"]))
+        else:
+            messages.append(AIMessage(content=msg["content"]))
+    return messages
+
+
+def main():
+    chat_history = []
+    store = MessageStore()
+    user_text = "What is the main argument of section 3? " * 5
+    bot_text = "I think the authors argue that... " * 20
+
+    legacy_total = store_total = 0.0
+    window_start = 0
+    print(f"{'turns':>6} {'rebuild (us/turn)':>18} {'store (us/turn)':>16}")
+    for turn in range(1, TURNS + 1):
+        # Old path: rebuild the prompt messages, then record the turn
+        start = time.perf_counter()
+        rebuild(chat_history)
+        chat_history.append({"role": "user", "content": user_text})
+        chat_history.append({"role": "assistant", "content": bot_text})
+        legacy_total += time.perf_counter() - start
+
+        # New path: hand the live message list to the prompt, then record the turn
+        start = time.perf_counter()
+        store.messages
+        store.add_turn(user_text, bot_text)
+        store_total += time.perf_counter() - start
+
+        if turn in CHECKPOINTS:
+            n = turn - window_start
+            print(f"{turn:>6} {legacy_total / n * 1e6:>18.1f} {store_total / n * 1e6:>16.1f}")
+            legacy_total = store_total = 0.0
+            window_start = turn
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,332 @@
+"""
+Concurrent-user load test of the Gradio app against the fake model
+
+Starts `main.py` locally (LLM_BACKEND=fake, GRADIO_SHARE=0, no network or
+API key needed) in a scratch directory and drives it through Gradio's
+HTTP queue API, the same way the browser does. Each simulated user gets
+its own session and does: upload a PDF -> process_file (extraction +
+TLDR) -> K chat turns -> save_history. Users start `--ramp` seconds
+apart and upload distinct files unless `--same-pdf` is given.
+
+For every endpoint it reports p50/p95/p99 latency, queue wait (join until
+the worker starts the event) and, for chat, time to the first streamed
+chunk. It also reports throughput and the server's resident memory before,
+during and after the run (read from /proc, so Linux only). Run it with
+increasing `--users` to find where p99 starts to degrade.
+
+Run from the repository root:
+    python benchmarks/bench_load.py [--users 20] [--turns 3] [--output load.json]
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+API = "/gradio_api"
+MESSAGE = "I think the authors' argument depends on how the study sample was chosen. What do you think?"
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def percentile(samples, q: float) -> float:
+    """Nearest-rank percentile"""
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, max(0, int(round(q / 100 * len(ordered))) - 1))]
+
+
+def distribution(samples):
+    if not samples:
+        return None
+    return {
+        "p50": percentile(samples, 50),
+        "p95": percentile(samples, 95),
+        "p99": percentile(samples, 99),
+        "max": max(samples),
+    }
+
+
+def rss_bytes(pid: int) -> int:
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) * 1024
+    return 0
+
+
+class MemorySampler(threading.Thread):
+    """Sample the server's resident memory until stopped"""
+
+    def __init__(self, pid: int, interval: float = 0.25):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.peak = 0
+        self._done = threading.Event()
+
+    def run(self):
+        while not self._done.is_set():
+            try:
+                self.peak = max(self.peak, rss_bytes(self.pid))
+            except OSError:
+                return
+            self._done.wait(self.interval)
+
+    def stop(self):
+        self._done.set()
+        self.join()
+
+
+def start_server(workdir: str, port: int, args) -> subprocess.Popen:
+    env = dict(
+        os.environ,
+        LLM_BACKEND="fake",
+        GRADIO_SHARE="0",
+        GRADIO_SERVER_PORT=str(port),
+        GRADIO_ANALYTICS_ENABLED="False",
+        MAX_SESSIONS=str(max(args.users * 2, 50)),
+        FAKE_LLM_LATENCY=str(args.latency),
+        FAKE_LLM_TOKENS_PER_SECOND=str(args.tokens_per_second),
+        FAKE_LLM_REPLY_TOKENS=str(args.reply_tokens),
+    )
+    env.pop("LLM_CACHE_PATH", None)
+    log = open(os.path.join(workdir, "server.log"), "w")
+    # A scratch working directory keeps caches and saved histories out of the repo
+    return subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, "main.py")], cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT
+    )
+
+
+def wait_until_ready(base_url: str, server: subprocess.Popen, timeout: float = 180.0) -> dict:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"Server exited with code {server.returncode}, see server.log")
+        try:
+            response = httpx.get(f"{base_url}/config", timeout=2)
+            if response.status_code == 200:
+                return response.json()
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    raise TimeoutError(f"Server did not start within {timeout:.0f}s")
+
+
+def endpoints(config: dict) -> dict:
+    """api_name -> (fn_index, trigger_id) for the app's events"""
+    result = {}
+    for dependency in config["dependencies"]:
+        name = dependency.get("api_name")
+        if name and name not in result:
+            targets = dependency.get("targets") or [[None]]
+            result[name] = (dependency["id"], targets[0][0])
+    return result
+
+
+class LoadUser:
+    """One simulated student with their own Gradio session"""
+
+    def __init__(self, client: httpx.AsyncClient, fns: dict, records: list):
+        self.client = client
+        self.fns = fns
+        self.records = records
+        self.session_hash = uuid.uuid4().hex[:11]
+
+    async def event(self, endpoint: str, data: list) -> dict:
+        """Run one queued event, recording latency, queue wait and first streamed output"""
+        fn_index, trigger_id = self.fns[endpoint]
+        start = time.perf_counter()
+        record = {"endpoint": endpoint, "success": False, "queue_wait": None, "first_output": None}
+        response = await self.client.post(f"{API}/queue/join", json={
+            "data": data,
+            "fn_index": fn_index,
+            "trigger_id": trigger_id,
+            "session_hash": self.session_hash,
+            "event_data": None,
+        })
+        response.raise_for_status()
+        event_id = response.json()["event_id"]
+
+        output = None
+        generated = 0
+        async with self.client.stream("GET", f"{API}/queue/data", params={"session_hash": self.session_hash}) as stream:
+            async for line in stream.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                message = json.loads(line[5:])
+                if message.get("event_id") not in (None, event_id):
+                    continue
+                kind = message.get("msg")
+                now = time.perf_counter() - start
+                if kind == "process_starts":
+                    record["queue_wait"] = now
+                elif kind == "process_generating":
+                    generated += 1
+                    # The chat handler first echoes the user message; the
+                    # second update carries the first model output
+                    if generated == 2:
+                        record["first_output"] = now
+                elif kind == "process_completed":
+                    record["success"] = bool(message.get("success"))
+                    output = message.get("output")
+                    break
+                elif kind in ("unexpected_error", "close_stream"):
+                    break
+        record["seconds"] = time.perf_counter() - start
+        self.records.append(record)
+        return output or {}
+
+    async def upload(self, pdf: bytes) -> dict:
+        start = time.perf_counter()
+        response = await self.client.post(f"{API}/upload", files={"files": ("article.pdf", pdf, "application/pdf")})
+        response.raise_for_status()
+        self.records.append({
+            "endpoint": "upload", "success": True, "queue_wait": None, "first_output": None,
+            "seconds": time.perf_counter() - start,
+        })
+        return {"path": response.json()[0], "orig_name": "article.pdf", "meta": {"_type": "gradio.FileData"}}
+
+    async def run(self, pdf: bytes, turns: int, think_time: float):
+        file_data = await self.upload(pdf)
+        await self.event("process_file", [file_data])
+        history = []
+        for turn in range(turns):
+            await asyncio.sleep(think_time)
+            message = f"{MESSAGE} ({turn + 1})"
+            await self.event("chat", [message, history])
+            # The bot keeps its own history; the UI copy only needs the shape
+            history = history + [{"role": "user", "content": message}, {"role": "assistant", "content": "..."}]
+        await self.event("save_history", [])
+
+
+async def run_users(base_url: str, fns: dict, pdf: bytes, args, records: list) -> float:
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    timeout = httpx.Timeout(args.timeout)
+
+    async def one_user(user: int):
+        await asyncio.sleep(user * args.ramp)
+        # A trailing comment gives each user a distinct file (and cache key)
+        # unless they should all read the same assigned paper
+        document = pdf if args.same_pdf else pdf + f"\n% user {user}\n".encode("ascii")
+        async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=timeout) as client:
+            await LoadUser(client, fns, records).run(document, args.turns, args.think_time)
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*(one_user(user) for user in range(args.users)), return_exceptions=True)
+    failures = [r for r in results if isinstance(r, BaseException)]
+    for failure in failures[:3]:
+        print(f"User failed: {failure!r}", file=sys.stderr)
+    return time.perf_counter() - start
+
+
+def summarize(records: list, wall: float, users: int, memory: dict) -> dict:
+    by_endpoint = {}
+    for record in records:
+        by_endpoint.setdefault(record["endpoint"], []).append(record)
+    report = {"wall_seconds": wall, "events_per_second": len(records) / wall, "users_per_minute": users / wall * 60}
+    report["endpoints"] = {
+        endpoint: {
+            "count": len(items),
+            "errors": sum(not r["success"] for r in items),
+            "latency": distribution([r["seconds"] for r in items]),
+            "queue_wait": distribution([r["queue_wait"] for r in items if r["queue_wait"] is not None]),
+            "first_output": distribution([r["first_output"] for r in items if r["first_output"] is not None]),
+        }
+        for endpoint, items in by_endpoint.items()
+    }
+    report["memory"] = memory
+    return report
+
+
+def print_report(report: dict, args):
+    print(f"{args.users} users x (upload, process_file, {args.turns} chat turns, save_history)")
+    print(f"wall {report['wall_seconds']:.1f}s  {report['events_per_second']:.1f} events/s  "
+          f"{report['users_per_minute']:.1f} users/min")
+    print(f"{'endpoint':<14} {'count':>5} {'errors':>6} {'p50':>7} {'p95':>7} {'p99':>7} "
+          f"{'wait p50':>9} {'wait p99':>9} {'first p50':>10}")
+    for endpoint, entry in report["endpoints"].items():
+        latency, wait, first = entry["latency"], entry["queue_wait"], entry["first_output"]
+        print(
+            f"{endpoint:<14} {entry['count']:>5} {entry['errors']:>6} "
+            f"{latency['p50']:>7.3f} {latency['p95']:>7.3f} {latency['p99']:>7.3f} "
+            f"{wait['p50'] if wait else float('nan'):>9.3f} {wait['p99'] if wait else float('nan'):>9.3f} "
+            f"{first['p50'] if first else float('nan'):>10.3f}"
+        )
+    memory = report["memory"]
+    mib = 1024 * 1024
+    print(f"server RSS: {memory['before'] / mib:.0f} MiB before, {memory['peak'] / mib:.0f} MiB peak, "
+          f"{memory['after'] / mib:.0f} MiB after ({memory['growth_per_user'] / 1024:.0f} KiB/user retained)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--turns", type=int, default=3, help="chat turns per user")
+    parser.add_argument("--ramp", type=float, default=0.1, help="seconds between user starts")
+    parser.add_argument("--think-time", type=float, default=0.5, help="seconds between a user's chat turns")
+    parser.add_argument("--pages", type=int, default=20, help="pages in the uploaded PDF")
+    parser.add_argument("--same-pdf", action="store_true", help="every user uploads the same file (TLDR cache hits)")
+    parser.add_argument("--latency", type=float, default=0.3, help="fake model time to first token (s)")
+    parser.add_argument("--tokens-per-second", type=float, default=80.0)
+    parser.add_argument("--reply-tokens", type=int, default=80)
+    parser.add_argument("--timeout", type=float, default=300.0, help="per-request timeout (s)")
+    parser.add_argument("--output", help="also write the report as JSON here")
+    args = parser.parse_args()
+
+    from bench_pdf import write_synthetic_pdf
+
+    with tempfile.TemporaryDirectory() as workdir:
+        pdf_path = os.path.join(workdir, "article.pdf")
+        write_synthetic_pdf(pdf_path, args.pages)
+        with open(pdf_path, "rb") as f:
+            pdf = f.read()
+
+        port = free_port()
+        base_url = f"http://127.0.0.1:{port}"
+        server = start_server(workdir, port, args)
+        try:
+            fns = endpoints(wait_until_ready(base_url, server))
+            # Let the background client preload finish before measuring
+            time.sleep(2)
+            before = rss_bytes(server.pid)
+            sampler = MemorySampler(server.pid)
+            sampler.start()
+            records = []
+            wall = asyncio.run(run_users(base_url, fns, pdf, args, records))
+            sampler.stop()
+            after = rss_bytes(server.pid)
+        finally:
+            server.terminate()
+            server.wait(timeout=30)
+
+    memory = {
+        "before": before,
+        "peak": max(sampler.peak, after),
+        "after": after,
+        "growth_per_user": (after - before) / args.users,
+    }
+    report = summarize(records, wall, args.users, memory)
+    report["settings"] = vars(args)
+    print_report(report, args)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+PDF text extraction: string concatenation vs. streaming iter_pdf_pages
+
+Builds a synthetic text PDF (500 pages by default) and compares wall time
+and peak traced memory of the old `text +=` loop with read_pdf, then times
+multi-process extraction.
+
+Run from the repository root:
+    python benchmarks/bench_pdf.py [pages] [workers]
+"""
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pypdf import PdfReader
+from bot_src.utils import read_pdf, iter_pdf_pages
+
+LINES_PER_PAGE = 45
+
+
+def write_synthetic_pdf(path: str, n_pages: int) -> None:
+    """Write a minimal PDF with n_pages pages of Helvetica text"""
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # page tree, filled in once page object ids are known
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    page_ids = []
+    for page in range(n_pages):
+        lines = [b"BT /F1 10 Tf 50 780 Td 14 TL"]
+        for line in range(LINES_PER_PAGE):
+            text = f"Page {page + 1} line {line + 1}: the quick brown fox studies peer review methods."
+            lines.append(f"({text}) Tj T*".encode("latin-1"))
+        lines.append(b"ET")
+        stream = b"\n".join(lines)
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        content_id = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_id
+        )
+        page_ids.append(len(objects))
+    kids = b" ".join(b"%d 0 R" % i for i in page_ids)
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, n_pages)
+
+    with open(path, "wb") as f:
+        f.write(b"%PDF-1.4\n")
+        offsets = []
+        for number, body in enumerate(objects, start=1):
+            offsets.append(f.tell())
+            f.write(b"%d 0 obj\n%s\nendobj\n" % (number, body))
+        xref = f.tell()
+        f.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+        for offset in offsets:
+            f.write(b"%010d 00000 n \n" % offset)
+        f.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref))
+
+
+def legacy_read_pdf(file_path: str) -> str:
+    """The original implementation"""
+    reader = PdfReader(file_path)
+    text = ""
+    for page in reader.pages:
+        text += page.extract_text()
+    return text
+
+
+def measure(fn, *args):
+    """Time an untraced run, then take peak memory from a second, traced run"""
+    start = time.perf_counter()
+    result = fn(*args)
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    fn(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def first_page(file_path: str) -> str:
+    return next(iter_pdf_pages(file_path))[1]
+
+
+def main():
+    n_pages = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "synthetic.pdf")
+        write_synthetic_pdf(path, n_pages)
+
+        legacy, legacy_time, legacy_peak = measure(legacy_read_pdf, path)
+        current, current_time, current_peak = measure(read_pdf, path)
+        start = time.perf_counter()
+        first_page(path)
+        first_time = time.perf_counter() - start
+        assert legacy == current
+
+        workers = int(sys.argv[2]) if len(sys.argv) > 2 else (os.cpu_count() or 1)
+        start = time.perf_counter()
+        parallel = read_pdf(path, workers=workers)
+        parallel_time = time.perf_counter() - start
+        assert parallel == current
+
+        print(f"pages: {n_pages}, characters: {len(current)}")
+        print(f"{'':<22} {'time (s)':>10} {'peak (MiB)':>12}")
+        print(f"{'legacy text +=':<22} {legacy_time:>10.2f} {legacy_peak / 2**20:>12.1f}")
+        print(f"{'read_pdf':<22} {current_time:>10.2f} {current_peak / 2**20:>12.1f}")
+        print(f"{'first page (iter)':<22} {first_time:>10.2f}")
+        print(f"{f'read_pdf, {workers} workers':<22} {parallel_time:>10.2f}   (speedup {current_time / parallel_time:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Chunking + BM25 index build time and query latency on a synthetic paper
+
+Run from the repository root:
+    python benchmarks/bench_retrieval.py [pages]
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bot_src.retrieval import HEADING_PATTERN, chunk_pages, BM25Index
+
+WORDS_PER_LINE = 12
+LINES_PER_PAGE = 50
+
+HEADINGS = ["3 Results", "2.1. Data", "2.1 Data Collection", "ABSTRACT", "Related Work", "4. Discussion and Limitations"]
+# Body lines that start with a number: counts, years and numbered list items
+NOT_HEADINGS = [
+    "12 participants completed the survey in 2019.",
+    "2019 was a year",
+    "1 the model",
+    "3. We recruited students from two universities.",
+    "1 First, collect the data;",
+    "2 Participants who dropped out of the study before the second session were excluded from all analyses",
+    "results were mixed",
+]
+
+
+def synthetic_pages(n_pages: int):
+    rng = random.Random(0)
+    vocab = [f"term{i}" for i in range(20000)]
+    pages = []
+    for page in range(n_pages):
+        lines = []
+        if page % 8 == 0:
+            lines.append(f"{page // 8 + 1} Section {page // 8 + 1}")
+        for _ in range(LINES_PER_PAGE):
+            lines.append(" ".join(rng.choice(vocab) for _ in range(WORDS_PER_LINE)))
+        pages.append("\n".join(lines))
+    return pages
+
+
+def check_headings():
+    """Fail loudly if heading detection regresses on the examples above"""
+    missed = [line for line in HEADINGS if not HEADING_PATTERN.match(line)]
+    false = [line for line in NOT_HEADINGS if HEADING_PATTERN.match(line)]
+    if missed or false:
+        raise SystemExit(f"heading detection: missed {missed}, false headings {false}")
+    # A false heading would end the chunk early and relabel the section
+    chunks = chunk_pages(["1 Introduction\n" + "\n".join(NOT_HEADINGS)])
+    assert [chunk.section for chunk in chunks] == ["1 Introduction"], [chunk.section for chunk in chunks]
+
+
+def main():
+    check_headings()
+    n_pages = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    pages = synthetic_pages(n_pages)
+
+    start = time.perf_counter()
+    chunks = chunk_pages(pages)
+    chunked = time.perf_counter()
+    index = BM25Index(chunks)
+    built = time.perf_counter()
+
+    queries = [" ".join(f"term{random.randrange(20000)}" for _ in range(8)) for _ in range(200)]
+    query_start = time.perf_counter()
+    for query in queries:
+        index.search(query, k=5)
+    query_time = (time.perf_counter() - query_start) / len(queries)
+
+    print(f"pages:        {n_pages}")
+    print(f"chunks:       {len(chunks)}")
+    print(f"chunking:     {(chunked - start) * 1000:.1f} ms")
+    print(f"index build:  {(built - chunked) * 1000:.1f} ms")
+    print(f"query (k=5):  {query_time * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+"""
+Session creation cost and HTTP connection reuse with a shared vs per-session model client
+
+Part 1 creates bots the way the app does for each new browser session.
+"per-session client" gives every bot its own ChainFactory, so each one
+builds its own ChatAnthropic client, prompts and chains, as bots did
+before the factory existed. "shared factory" is the default.
+
+Part 2 runs concurrent sessions against a local stand-in for the Anthropic
+Messages API. Each session sends a few messages with some think time
+between them. The server counts the TCP connections it accepts, which
+shows how many connections each setup opens for the same traffic. The
+stand-in is plain HTTP, so TLS handshake cost is not included. Recent
+langchain-anthropic versions already share one HTTP pool per base URL
+across client instances, so both setups keep connections alive; with the
+shared factory that no longer depends on the library version.
+
+Run from the repository root:
+    python benchmarks/bench_sessions.py [sessions] [turns]
+"""
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+import tracemalloc
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+SERVER_DELAY = 0.02
+THINK_TIME = (0.05, 0.3)
+
+
+class FakeMessagesHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    connections = 0
+    requests = 0
+    lock = threading.Lock()
+
+    def setup(self):
+        super().setup()
+        with FakeMessagesHandler.lock:
+            FakeMessagesHandler.connections += 1
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        with FakeMessagesHandler.lock:
+            FakeMessagesHandler.requests += 1
+        time.sleep(SERVER_DELAY)
+        body = json.dumps({
+            "id": "msg_bench",
+            "type": "message",
+            "role": "assistant",
+            "model": "claude-3-5-sonnet-20241022",
+            "content": [{"type": "text", "text": "That is an interesting point."}],
+            "stop_reason": "end_turn",
+            "stop_sequence": None,
+            "usage": {"input_tokens": 50, "output_tokens": 8},
+        }).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class FakeMessagesServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # Many sessions connect at once; the default backlog of 5 would reset connections
+    request_queue_size = 512
+
+
+def start_server():
+    """Start a stand-in API server and point new model clients at it
+
+    Every call uses a new port, so clients created afterwards get a new
+    connection pool (langchain-anthropic caches pools per base URL).
+    """
+    server = FakeMessagesServer(("127.0.0.1", 0), FakeMessagesHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    os.environ["ANTHROPIC_BASE_URL"] = f"http://127.0.0.1:{server.server_address[1]}"
+    return server
+
+
+def make_bot(shared_chains=None):
+    """A bot using `shared_chains`, or with its own client and chains if None"""
+    from bot_src.bot import CuriousPeerBot
+    from bot_src.chains import ChainFactory
+
+    if shared_chains is not None:
+        return CuriousPeerBot(chains=shared_chains)
+    bot = CuriousPeerBot(chains=ChainFactory())
+    # Bots used to build their client and chain in the constructor
+    bot.chains.chat_chain
+    return bot
+
+
+def bench_creation(n_sessions: int):
+    from bot_src.chains import ChainFactory
+
+    shared_chains = ChainFactory()
+    shared_chains.chat_chain  # built once per process, outside the measurement
+    for shared in (False, True):
+        label = "shared factory" if shared else "per-session client"
+        chains = shared_chains if shared else None
+        make_bot(chains)  # warm imports
+        tracemalloc.start()
+        start = time.perf_counter()
+        bots = [make_bot(chains) for _ in range(n_sessions)]
+        elapsed = time.perf_counter() - start
+        memory, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"  {label:<20} {elapsed / n_sessions * 1000:7.2f} ms/session  {memory / n_sessions / 1024:8.1f} KiB/session")
+        del bots
+
+
+async def run_session(bot, turns: int, rng: random.Random, latencies):
+    bot.set_article("A short article about peer learning.")
+    for turn in range(turns):
+        await asyncio.sleep(rng.uniform(*THINK_TIME))
+        start = time.perf_counter()
+        await bot.achat(f"What do you think about point {turn}?")
+        latencies.append(time.perf_counter() - start)
+
+
+def bench_connections(n_sessions: int, turns: int):
+    from bot_src.chains import ChainFactory
+
+    for shared in (False, True):
+        label = "shared factory" if shared else "per-session client"
+        server = start_server()
+        FakeMessagesHandler.connections = 0
+        FakeMessagesHandler.requests = 0
+        chains = ChainFactory() if shared else None
+        bots = [make_bot(chains) for _ in range(n_sessions)]
+        latencies = []
+        rng = random.Random(0)
+
+        async def run_all():
+            await asyncio.gather(*(run_session(bot, turns, rng, latencies) for bot in bots))
+
+        start = time.perf_counter()
+        asyncio.run(run_all())
+        elapsed = time.perf_counter() - start
+        latencies.sort()
+        print(
+            f"  {label:<20} {FakeMessagesHandler.requests:5d} requests  "
+            f"{FakeMessagesHandler.connections:4d} connections  "
+            f"p50 {statistics.median(latencies) * 1000:6.1f} ms  "
+            f"p95 {latencies[int(len(latencies) * 0.95)] * 1000:6.1f} ms  "
+            f"wall {elapsed:.2f}s"
+        )
+        server.shutdown()
+
+
+def main():
+    n_sessions = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    turns = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+    os.environ.setdefault("ANTHROPIC_API_KEY", "bench")
+    os.environ.pop("LLM_CACHE_PATH", None)
+
+    print(f"Session creation ({n_sessions} sessions)")
+    bench_creation(n_sessions)
+    print(f"\n{n_sessions} concurrent sessions x {turns} messages")
+    bench_connections(n_sessions, turns)
+
+
+if __name__ == "__main__":
+    main()
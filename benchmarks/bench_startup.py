@@ -0,0 +1,77 @@
+"""
+Cold-start cost of importing the package and the app, from `python -X importtime`
+
+Each target is imported in a fresh interpreter. The report shows the wall
+time, the import time summed over all modules, and the top-level packages
+whose own modules take the longest to import.
+
+Run from the repository root:
+    python benchmarks/bench_startup.py [runs] [top]
+"""
+import os
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+TARGETS = {
+    "bot_src": "import bot_src",
+    "bot_src.bot": "import bot_src.bot",
+    "first bot": "from bot_src.bot import CuriousPeerBot; CuriousPeerBot()",
+    "main (app built, not launched)": "import main",
+}
+
+
+def run_importtime(code: str):
+    """Run code in a fresh interpreter; returns wall seconds and {module: self_us}"""
+    env = dict(os.environ, ANTHROPIC_API_KEY=os.getenv("ANTHROPIC_API_KEY", "startup-benchmark"))
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=ROOT, env=env, capture_output=True, text=True
+    )
+    wall = time.perf_counter() - start
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr[-2000:])
+
+    modules = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, _, name = line[len("import time:"):].split("|")
+        modules[name.strip()] = int(self_us)
+    return wall, modules
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    top = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+
+    for label, code in TARGETS.items():
+        walls = []
+        packages = defaultdict(list)
+        totals = []
+        for _ in range(runs):
+            wall, modules = run_importtime(code)
+            walls.append(wall)
+            totals.append(sum(modules.values()))
+            per_package = defaultdict(int)
+            for name, self_us in modules.items():
+                per_package[name.split(".")[0]] += self_us
+            for package, self_us in per_package.items():
+                packages[package].append(self_us)
+
+        # Best of several runs: the first one also pays for a cold disk cache
+        print(f"{label}")
+        print(f"  wall:          {min(walls) * 1000:.0f} ms (best of {runs})")
+        print(f"  import time:   {min(totals) / 1000:.0f} ms across all modules")
+        slowest = sorted(packages.items(), key=lambda item: -min(item[1]))[:top]
+        for name, values in slowest:
+            print(f"    {min(values) / 1000:8.1f} ms  {name}")
+        print()
+
+
+if __name__ == "__main__":
+    main()
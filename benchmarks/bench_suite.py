@@ -0,0 +1,224 @@
+"""
+End-to-end benchmark suite against the local fake model, with JSON output
+
+Runs entirely offline (LLM_BACKEND=fake, no API key needed) so results can
+be compared across commits:
+
+- pdf_extraction: parse a synthetic PDF with pypdf (text store disabled)
+- tldr_single / tldr_map_reduce: TLDR of a short text and of the whole PDF
+- chat: a multi-turn streamed conversation, with time to first chunk
+- assessment_flow_*: the article bots from initial questions through
+  assessment, critical questions, quality check and synthesis, for the
+  Anthropic script (serial and speculative) and the OpenAI script
+
+Model time is simulated, so results show the overhead and concurrency of
+the code around the model calls, not provider latency. Every benchmark
+reports wall-time statistics over its runs; the JSON also records the
+commit, Python version and fake-model settings.
+
+Run from the repository root:
+    python benchmarks/bench_suite.py [--runs 3] [--output results.json]
+"""
+import argparse
+import asyncio
+import contextlib
+import datetime
+import importlib.util
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+ANSWER = "The article claims that explaining reasoning to a peer exposes gaps in understanding."
+
+
+def summarize(samples):
+    return {
+        "runs": len(samples),
+        "min": min(samples),
+        "median": statistics.median(samples),
+        "mean": statistics.fmean(samples),
+        "max": max(samples),
+    }
+
+
+def timed(fn, runs: int):
+    samples = []
+    result = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = fn()
+        samples.append(time.perf_counter() - start)
+    return summarize(samples), result
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def load_script(filename: str, name: str):
+    """Import one of the hyphenated top-level article bot scripts"""
+    spec = importlib.util.spec_from_file_location(name, os.path.join(ROOT, filename))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def bench_pdf(path: str, runs: int):
+    from bot_src.utils import read_pdf_pages
+
+    seconds, pages = timed(lambda: read_pdf_pages(path), runs)
+    return {"seconds": seconds, "pages": len(pages), "pages_per_second": len(pages) / seconds["median"]}, pages
+
+
+def bench_tldr(text: str, runs: int):
+    from bot_src.bot import CuriousPeerBot
+
+    bot = CuriousPeerBot()
+    seconds, _ = timed(lambda: bot.generate_tldr(text), runs)
+    usage = bot.get_usage_stats()
+    return {"seconds": seconds, "model_calls_per_run": usage["calls"] / runs, "input_tokens_per_run": usage["input_tokens"] / runs}
+
+
+def bench_chat(article: str, turns: int, runs: int):
+    from bot_src.bot import CuriousPeerBot
+
+    turn_seconds, first_chunk_seconds = [], []
+
+    async def conversation():
+        bot = CuriousPeerBot()
+        bot.set_article(article)
+        for turn in range(turns):
+            start = time.perf_counter()
+            first = None
+            async for _ in bot.astream_chat(f"What do you think about point {turn}? {ANSWER}"):
+                if first is None:
+                    first = time.perf_counter() - start
+            turn_seconds.append(time.perf_counter() - start)
+            first_chunk_seconds.append(first)
+        return bot
+
+    seconds, bot = timed(lambda: asyncio.run(conversation()), runs)
+    bot.compactor.wait()
+    return {
+        "seconds": seconds,
+        "turns": turns,
+        "turn_seconds": summarize(turn_seconds),
+        "first_chunk_seconds": summarize(first_chunk_seconds),
+        "history": bot.get_history_stats(),
+    }
+
+
+def bench_assessment(module, article: str, runs: int, **bot_kwargs):
+    bots = []
+
+    def flow():
+        bot = module.ArticleUnderstandingBot(article, **bot_kwargs)
+        questions = bot.start_initial_assessment()["questions"]
+        bot.record_exchange(questions, ANSWER)
+        assessment = bot.assess_understanding(questions, ANSWER)
+        critical = bot.generate_critical_questions(ANSWER)
+        bot.record_exchange(critical, ANSWER)
+        bot.check_response_quality(critical, ANSWER)
+        bot.guide_synthesis()
+        bots.append(bot)
+        return assessment["status"]
+
+    seconds, status = timed(flow, runs)
+    stages = {}
+    for bot in bots:
+        for stage, entry in bot.stats.stages.items():
+            total = stages.setdefault(stage, {"calls": 0, "seconds": 0.0})
+            total["calls"] += entry["calls"]
+            total["seconds"] += entry["seconds"]
+    return {
+        "seconds": seconds,
+        "status": status,
+        "stages": {
+            stage: {"calls_per_run": entry["calls"] / runs, "mean_seconds": entry["seconds"] / entry["calls"]}
+            for stage, entry in stages.items()
+        },
+    }
+
+
+def run_all(args):
+    from bench_pdf import write_synthetic_pdf
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "article.pdf")
+        write_synthetic_pdf(path, args.pages)
+        results["pdf_extraction"], pages = bench_pdf(path, args.runs)
+
+    text = "".join(pages)
+    short_text = "".join(pages[:2])
+    results["tldr_single"] = bench_tldr(short_text, args.runs)
+    results["tldr_map_reduce"] = bench_tldr(text, args.runs)
+    results["chat"] = bench_chat(short_text, args.turns, args.runs)
+
+    anthropic_script = load_script("anth-article-chatbot.py", "anth_article_chatbot")
+    openai_script = load_script("article-chatbot.py", "article_chatbot")
+    results["assessment_flow_anthropic"] = bench_assessment(anthropic_script, short_text, args.runs)
+    results["assessment_flow_anthropic_speculative"] = bench_assessment(
+        anthropic_script, short_text, args.runs, speculative=True
+    )
+    results["assessment_flow_openai"] = bench_assessment(openai_script, short_text, args.runs)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--pages", type=int, default=100, help="pages in the synthetic PDF")
+    parser.add_argument("--turns", type=int, default=8, help="chat turns per conversation")
+    parser.add_argument("--latency", type=float, default=0.05, help="fake model time to first token (s)")
+    parser.add_argument("--tokens-per-second", type=float, default=400.0)
+    parser.add_argument("--reply-tokens", type=int, default=60)
+    parser.add_argument("--output", help="write JSON here instead of stdout")
+    args = parser.parse_args()
+
+    fake = {
+        "FAKE_LLM_LATENCY": str(args.latency),
+        "FAKE_LLM_TOKENS_PER_SECOND": str(args.tokens_per_second),
+        "FAKE_LLM_REPLY_TOKENS": str(args.reply_tokens),
+    }
+    os.environ.update(fake)
+    os.environ["LLM_BACKEND"] = "fake"
+    os.environ.pop("LLM_CACHE_PATH", None)
+
+    # The bots log to stdout; keep it for the JSON report
+    with contextlib.redirect_stdout(sys.stderr):
+        results = run_all(args)
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "settings": {"runs": args.runs, "pages": args.pages, "turns": args.turns, **fake},
+        "results": results,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+        print(f"Results written to {args.output}", file=sys.stderr)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -6,11 +6,38 @@ A chatbot designed to engage in academic discussions and analysis.
 This package contains the core components for the Curious Peer Bot:
 - Bot implementation (bot.py)
 - Utility functions (utils.py)
+- Per-session bot pool (sessions.py)
 - System prompts and configurations
 """
 
-from .bot import CuriousPeerBot
-from .utils import read_pdf, save_chat_history
+import importlib
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .bot import CuriousPeerBot
+    from .utils import read_pdf, read_pdf_pages, iter_pdf_pages, save_chat_history
+    from .sessions import SessionPool
+
+# Submodules are imported on first attribute access, so `import bot_src`
+# (and `python -m bot_src.<module>`) does not pay for langchain or pypdf
+_LAZY_EXPORTS = {
+    'CuriousPeerBot': '.bot',
+    'read_pdf': '.utils',
+    'read_pdf_pages': '.utils',
+    'iter_pdf_pages': '.utils',
+    'save_chat_history': '.utils',
+    'SessionPool': '.sessions',
+}
+
+def __getattr__(name):
+    if name in _LAZY_EXPORTS:
+        value = getattr(importlib.import_module(_LAZY_EXPORTS[name], __name__), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def __dir__():
+    return sorted(list(globals()) + list(_LAZY_EXPORTS))
 
 __version__ = "1.0.0"
 __author__ = "Minjung Shin"
@@ -19,5 +46,8 @@ __email__ = "mjshin77@snu.ac.kr"
 __all__ = [
     'CuriousPeerBot',
     'read_pdf',
+    'read_pdf_pages',
+    'iter_pdf_pages',
     'save_chat_history',
+    'SessionPool',
 ]
\ No newline at end of file
@@ -0,0 +1,56 @@
+"""
+Chat model backend selection
+
+LLM_BACKEND chooses the provider for every bot: `anthropic`, `openai` or
+`fake` (the local FakeChatModel, for benchmarks and offline runs). Each
+entry point passes its own default, so `main.py` and
+`anth-article-chatbot.py` stay on Anthropic and `article-chatbot.py` on
+OpenAI unless the variable is set. Provider SDKs are imported only when
+their backend is used.
+"""
+from typing import Any, Optional
+import os
+
+BACKENDS = ("anthropic", "openai", "fake")
+DEFAULT_MODELS = {
+    "anthropic": "claude-3-5-sonnet-20241022",
+    "openai": "gpt-4o",
+    "fake": "fake-peer-model",
+}
+API_KEY_ENV = {
+    "anthropic": "ANTHROPIC_API_KEY",
+    "openai": "OPENAI_API_KEY",
+}
+
+
+def get_backend(default: str = "anthropic") -> str:
+    """Backend named by LLM_BACKEND, or `default`"""
+    backend = (os.getenv("LLM_BACKEND") or default).strip().lower()
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown LLM_BACKEND {backend!r}, expected one of {', '.join(BACKENDS)}")
+    return backend
+
+
+def require_api_key(backend: str) -> None:
+    """Raise if the backend needs an API key that is not set"""
+    env = API_KEY_ENV.get(backend)
+    if env and not os.getenv(env):
+        raise ValueError(f"{env} not found in environment variables")
+
+
+def create_chat_model(backend: Optional[str] = None, model: Optional[str] = None, **kwargs: Any):
+    """Chat model for `backend` (default: get_backend()); kwargs such as
+    temperature, max_tokens and cache are passed to the model"""
+    backend = backend or get_backend()
+    model = model or DEFAULT_MODELS[backend]
+    if backend == "anthropic":
+        from langchain_anthropic import ChatAnthropic
+
+        return ChatAnthropic(model=model, api_key=os.getenv("ANTHROPIC_API_KEY"), **kwargs)
+    if backend == "openai":
+        from langchain_openai import ChatOpenAI
+
+        return ChatOpenAI(model=model, api_key=os.getenv("OPENAI_API_KEY"), **kwargs)
+    from .fake_llm import FakeChatModel
+
+    return FakeChatModel.from_env(model_name=model, **kwargs)
@@ -1,77 +1,319 @@
-from langchain_anthropic import ChatAnthropic
-from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain_core.messages import HumanMessage, AIMessage
-from langchain_core.output_parsers import StrOutputParser
-from typing import List, Dict
-import os
+from langchain_core.messages import SystemMessage
+from typing import List, Dict, Iterator, AsyncIterator, Optional, Tuple
+import time
+
+from .history import MessageStore, HistoryCompactor, ChatRecord, estimate_tokens
+from .callbacks import UsageTracker
+from .chains import ChainFactory, get_chain_factory
+from .prompts import PromptRegistry, PromptVersion, get_prompt_registry
+
+def preload_model_client():
+    """Create the shared model client and chains ahead of the first model call
+
+    They are otherwise created on first use; calling this from a background
+    thread after startup keeps that work off both the startup path and the
+    first request.
+    """
+    get_chain_factory().chat_chain
+
+def split_by_tokens(text: str, chunk_tokens: int) -> List[str]:
+    """Split text into parts of roughly `chunk_tokens` tokens, preferring paragraph breaks"""
+    max_chars = chunk_tokens * 4
+    parts = []
+    start = 0
+    while start < len(text):
+        end = min(start + max_chars, len(text))
+        if end < len(text):
+            # Back off to the last paragraph or line break in the second half of the window
+            for sep in ("\n\n", "\n", " "):
+                cut = text.rfind(sep, start + max_chars // 2, end)
+                if cut != -1:
+                    end = cut + len(sep)
+                    break
+        parts.append(text[start:end])
+        start = end
+    return parts
 
 class CuriousPeerBot:
-    def __init__(self):
+    # Bump whenever the TLDR prompts change, so cached summaries are not reused
+    TLDR_PROMPT_VERSION = "2"
+
+    def __init__(
+        self,
+        history_token_budget: int = 8000,
+        keep_recent_turns: int = 4,
+        full_text_token_limit: int = 30000,
+        retrieval_top_k: int = 5,
+        tldr_single_shot_limit: int = 40000,
+        tldr_chunk_tokens: int = 12000,
+        tldr_max_concurrency: int = 4,
+        chains: Optional[ChainFactory] = None,
+        prompts: Optional[PromptRegistry] = None,
+        prompt_variant: Optional[str] = None
+    ):
         self.current_file = "chat_session" 
 
-        self.chat_model = ChatAnthropic(
-            model="claude-3-5-sonnet-20241022",
-            anthropic_api_key=os.getenv('ANTHROPIC_API_KEY'),
-            temperature=0.7,
-            max_tokens=4096
-        )
+        # Model client, prompts and chains are shared by every bot in the
+        # process; a bot only holds its own session state
+        self.chains = chains if chains is not None else get_chain_factory()
         
-        with open("bot_src/sys_prompt.txt", "r") as f:
-            self.system_prompt = f.read()
+        # The system prompt is looked up on every turn, so edits to the prompt
+        # file apply to running sessions; A/B routing picks the variant once
+        self.prompts = prompts if prompts is not None else get_prompt_registry()
+        self.prompt_variant = prompt_variant or self.prompts.assign_variant()
             
-        self.chat_history: List[Dict[str, str]] = []
-        self.output_parser = StrOutputParser()
-        
-        # Create conversation prompt
-        self.prompt = ChatPromptTemplate.from_messages([
-            ("system", self.system_prompt),
-            MessagesPlaceholder(variable_name="chat_history"),
-            ("human", "{input}")
-        ])
-        
-        # Create the chain
-        self.chain = self.prompt | self.chat_model | self.output_parser
+        self.history = MessageStore()
+        # Older turns are folded into a running summary once the history exceeds the budget
+        self.compactor = HistoryCompactor(
+            self.history,
+            self._summarize_history,
+            token_budget=history_token_budget,
+            keep_recent_turns=keep_recent_turns
+        )
+        self.usage = UsageTracker()
+        # Per-session callbacks, passed on every call to the shared chains
+        self.run_config = {"callbacks": [self.usage]}
+        
+        # System prompt and article, sent as one cacheable prefix; rebuilt
+        # only when the article or the prompt version changes
+        self.article = None
+        self._article_revision = 0
+        self._context = (None, None)
+        
+        # Articles longer than the limit are served from a chunk index instead
+        self.full_text_token_limit = full_text_token_limit
+        self.retrieval_top_k = retrieval_top_k
+        self.index = None
+        
+        # Long articles are summarized map-reduce style, several parts at a time
+        self.tldr_single_shot_limit = tldr_single_shot_limit
+        self.tldr_chunk_tokens = tldr_chunk_tokens
+        self.tldr_max_concurrency = tldr_max_concurrency
+        self.last_tldr_timings: Dict = {}
+    
+    @property
+    def system_prompt(self) -> str:
+        """Current text of this session's prompt variant"""
+        return self.prompts.get(self.prompt_variant).text
+    
+    @property
+    def model_name(self) -> str:
+        return self.chains.model_name
+    
+    @property
+    def chat_model(self):
+        """The shared chat model"""
+        return self.chains.chat_model
     
     def set_current_file(self, filename: str):
         """Set current file name"""
         self.current_file = filename
+
+    def set_article(self, text: str, pages: Optional[List[str]] = None):
+        """Ground the discussion in the article text
+        
+        The system prompt and article form a fixed prefix marked with
+        Anthropic's cache_control, so later turns read it from the prompt
+        cache instead of paying for it again. Articles longer than
+        `full_text_token_limit` are chunked and indexed instead, and each
+        turn only carries the chunks most relevant to the user's message.
+        """
+        if estimate_tokens(text) > self.full_text_token_limit:
+            # numpy/scipy are only needed for long articles
+            from .retrieval import chunk_pages, BM25Index
+            
+            self.index = BM25Index(chunk_pages(pages if pages is not None else [text]))
+        else:
+            self.index = None
+        self.article = text
+        self._article_revision += 1
+
+    def _context_for(self, prompt: PromptVersion) -> List[SystemMessage]:
+        """System prompt plus, unless indexed, the full article"""
+        key = (prompt.version, self._article_revision)
+        cached_key, context = self._context
+        if cached_key == key:
+            return context
+        if self.article is None or self.index is not None:
+            context = [SystemMessage(content=prompt.text)]
+        else:
+            context = [SystemMessage(content=[
+                {"type": "text", "text": prompt.text},
+                {
+                    "type": "text",
+                    "text": f"The article we are discussing:\n\n<article>\n{self.article}\n</article>",
+                    "cache_control": {"type": "ephemeral"}
+                }
+            ])]
+        self._context = (key, context)
+        return context
         
+    def _tldr_map_inputs(self, text: str) -> List[Dict]:
+        parts = split_by_tokens(text, self.tldr_chunk_tokens)
+        return [{"part": i, "parts": len(parts), "text": part} for i, part in enumerate(parts, start=1)]
+
+    @staticmethod
+    def _join_summaries(summaries: List[str]) -> str:
+        return "\n\n".join(f"Part {i}:\n{summary}" for i, summary in enumerate(summaries, start=1))
+
+    def _log_tldr_timings(self, timings: Dict):
+        self.last_tldr_timings = timings
+        print("TLDR timings: " + ", ".join(
+            f"{key}={value:.2f}s" if isinstance(value, float) else f"{key}={value}"
+            for key, value in timings.items()
+        ))
+
     def generate_tldr(self, text: str) -> str:
-        """Generate TLDR summary of the article"""
-        tldr_prompt = ChatPromptTemplate.from_messages([
-            ("system", "You are an expert at summarizing academic articles concisely."),
-            ("human", "Please provide a TLDR summary of the following academic article. "
-                     "Focus on the main findings, methodology, and significance. "
-                     "Use bullet points for clarity:\n\n{text}")
-        ])
+        """Generate TLDR summary of the article
+        
+        Articles over `tldr_single_shot_limit` tokens are split into parts
+        that are summarized concurrently and then combined (map-reduce).
+        """
+        start = time.perf_counter()
+        if estimate_tokens(text) <= self.tldr_single_shot_limit:
+            tldr = self.chains.tldr_chain.invoke({"text": text}, config=self.run_config)
+            self._log_tldr_timings({"mode": "single", "total": time.perf_counter() - start})
+            return tldr
+        
+        inputs = self._tldr_map_inputs(text)
+        summaries = self.chains.tldr_map_chain.batch(
+            inputs, config={**self.run_config, "max_concurrency": self.tldr_max_concurrency}
+        )
+        mapped = time.perf_counter()
+        tldr = self.chains.tldr_reduce_chain.invoke({"text": self._join_summaries(summaries)}, config=self.run_config)
+        end = time.perf_counter()
+        self._log_tldr_timings({
+            "mode": "map_reduce",
+            "parts": len(inputs),
+            "map": mapped - start,
+            "reduce": end - mapped,
+            "total": end - start
+        })
+        return tldr
+
+    async def agenerate_tldr(self, text: str) -> str:
+        """Async version of generate_tldr"""
+        start = time.perf_counter()
+        if estimate_tokens(text) <= self.tldr_single_shot_limit:
+            tldr = await self.chains.tldr_chain.ainvoke({"text": text}, config=self.run_config)
+            self._log_tldr_timings({"mode": "single", "total": time.perf_counter() - start})
+            return tldr
+        
+        inputs = self._tldr_map_inputs(text)
+        summaries = await self.chains.tldr_map_chain.abatch(
+            inputs, config={**self.run_config, "max_concurrency": self.tldr_max_concurrency}
+        )
+        mapped = time.perf_counter()
+        tldr = await self.chains.tldr_reduce_chain.ainvoke(
+            {"text": self._join_summaries(summaries)}, config=self.run_config
+        )
+        end = time.perf_counter()
+        self._log_tldr_timings({
+            "mode": "map_reduce",
+            "parts": len(inputs),
+            "map": mapped - start,
+            "reduce": end - mapped,
+            "total": end - start
+        })
+        return tldr
+
+    def _summarize_history(self, previous_summary: Optional[str], records: List[ChatRecord]) -> str:
+        """Fold older chat turns into the running summary"""
+        conversation = "\n".join(
+            f"{'Student' if r.role == 'user' else 'Bot'}: {r.content}" for r in records
+        )
+        return self.chains.history_summary_chain.invoke({
+            "summary": previous_summary or "(none)",
+            "conversation": conversation
+        })
+
+    def _chain_input(self, user_input: str, prompt: PromptVersion) -> Dict:
+        """Build the chat chain input for this turn"""
+        return {
+            "context": self._context_for(prompt),
+            "chat_history": self.compactor.messages(),
+            "input": self._with_excerpts(user_input)
+        }
+
+    def _with_excerpts(self, user_input: str) -> str:
+        """Prepend the article chunks most relevant to the message, if indexed"""
+        if self.index is None:
+            return user_input
+        chunks = self.index.search(user_input, k=self.retrieval_top_k)
+        if not chunks:
+            return user_input
+        excerpts = "\n\n".join(f"[{chunk.label()}]\n{chunk.text}" for chunk in chunks)
+        return f"Relevant excerpts from the article:\n\n{excerpts}\n\n---\n\n{user_input}"
+
+    def _begin_turn(self, user_input: str) -> Tuple[Dict, Dict, Tuple[PromptVersion, UsageTracker, float]]:
+        """Chain input and run config for a turn, using the current prompt version"""
+        prompt = self.prompts.get(self.prompt_variant)
+        turn_usage = UsageTracker()
+        config = {"callbacks": [self.usage, turn_usage]}
+        return self._chain_input(user_input, prompt), config, (prompt, turn_usage, time.perf_counter())
+
+    def _record_turn(self, user_input: str, response: str, turn: Tuple[PromptVersion, UsageTracker, float]):
+        """Update chat history, compact it in the background if needed and record the turn per prompt version"""
+        prompt, turn_usage, start = turn
+        seconds = time.perf_counter() - start
+        usage = turn_usage.summary()
+        self.prompts.record_turn(prompt, seconds, usage)
         
-        chain = tldr_prompt | self.chat_model | self.output_parser
-        return chain.invoke({"text": text})
+        self.history.add_turn(user_input, response)
+        self.compactor.maybe_compact()
         
     def chat(self, user_input: str) -> str:
         """Generate response to user input"""
-        # Convert chat history to message format
-        messages = []
-        for msg in self.chat_history:
-            if msg["role"] == "user":
-                messages.append(HumanMessage(content=msg["content"]))
-            else:
-                messages.append(AIMessage(content=msg["content"]))
-        
-        # Generate response
-        response = self.chain.invoke({
-            "chat_history": messages,
-            "input": user_input
-        })
+        inputs, config, turn = self._begin_turn(user_input)
+        response = self.chains.chat_chain.invoke(inputs, config=config)
+        
+        self._record_turn(user_input, response, turn)
+        
+        return response
+
+    def stream_chat(self, user_input: str) -> Iterator[str]:
+        """Stream response to user input chunk by chunk
+        
+        Chat history is only updated once the stream has finished, so an
+        interrupted stream leaves the history untouched.
+        """
+        inputs, config, turn = self._begin_turn(user_input)
+        chunks = []
+        for chunk in self.chains.chat_chain.stream(inputs, config=config):
+            chunks.append(chunk)
+            yield chunk
         
-        # Update chat history
-        self.chat_history.append({"role": "user", "content": user_input})
-        self.chat_history.append({"role": "assistant", "content": response})
+        self._record_turn(user_input, "".join(chunks), turn)
+
+    async def achat(self, user_input: str) -> str:
+        """Async version of chat"""
+        inputs, config, turn = self._begin_turn(user_input)
+        response = await self.chains.chat_chain.ainvoke(inputs, config=config)
+        
+        self._record_turn(user_input, response, turn)
         
         return response
 
+    async def astream_chat(self, user_input: str) -> AsyncIterator[str]:
+        """Async version of stream_chat"""
+        inputs, config, turn = self._begin_turn(user_input)
+        chunks = []
+        async for chunk in self.chains.chat_chain.astream(inputs, config=config):
+            chunks.append(chunk)
+            yield chunk
+        
+        self._record_turn(user_input, "".join(chunks), turn)
+
     def get_chat_history(self) -> List[Dict[str, str]]:
         """Return chat history"""
-        return self.chat_history
+        return self.history.as_dicts()
+
+    def get_history_stats(self) -> Dict[str, int]:
+        """Return token budget, compaction count and tokens saved for this session"""
+        return self.compactor.stats()
+
+    def get_usage_stats(self) -> Dict:
+        """Return token usage, including prompt cache reads/writes, for this session"""
+        return self.usage.summary()
     
 
@@ -0,0 +1,99 @@
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+import threading
+
+
+class UsageTracker(BaseCallbackHandler):
+    """Record token usage, including prompt cache reads/writes, for each model call"""
+
+    def __init__(self, name: str = "bot", max_calls: int = 200, verbose: bool = False):
+        self.name = name
+        self.verbose = verbose
+        self.calls: Deque[Dict[str, int]] = deque(maxlen=max_calls)
+        self.totals = {"input_tokens": 0, "output_tokens": 0, "cache_read": 0, "cache_creation": 0, "calls": 0, "cached_calls": 0}
+        self._lock = threading.Lock()
+
+    def on_llm_end(self, response: LLMResult, **kwargs: Any) -> None:
+        for generations in response.generations:
+            for generation in generations:
+                message = getattr(generation, "message", None)
+                if message is not None and message.response_metadata.get("from_cache"):
+                    # Replayed from the response cache (see llm_cache), not billed
+                    with self._lock:
+                        self.totals["cached_calls"] += 1
+                    continue
+                usage = getattr(message, "usage_metadata", None)
+                if usage:
+                    self._record(usage)
+
+    def _record(self, usage: Dict[str, Any]) -> None:
+        details = usage.get("input_token_details") or {}
+        call = {
+            "input_tokens": usage.get("input_tokens", 0),
+            "output_tokens": usage.get("output_tokens", 0),
+            "cache_read": details.get("cache_read") or 0,
+            "cache_creation": details.get("cache_creation") or 0,
+        }
+        with self._lock:
+            self.calls.append(call)
+            for key, value in call.items():
+                self.totals[key] += value
+            self.totals["calls"] += 1
+        if self.verbose:
+            print(
+                f"[{self.name}] input={call['input_tokens']} output={call['output_tokens']} "
+                f"cache_read={call['cache_read']} cache_write={call['cache_creation']}"
+            )
+
+    def summary(self) -> Dict[str, Any]:
+        """Totals across all recorded calls plus the most recent call"""
+        with self._lock:
+            return {**self.totals, "last_call": self.calls[-1] if self.calls else None}
+
+    def recent_calls(self) -> List[Dict[str, int]]:
+        with self._lock:
+            return list(self.calls)
+
+
+class StageStats:
+    """Per-stage latency and prompt-cache usage for a sequence of model calls"""
+
+    def __init__(self):
+        self.stages: Dict[str, Dict[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage: str, seconds: float, usage: Optional[Dict[str, Any]] = None) -> None:
+        usage = usage or {}
+        details = usage.get("input_token_details") or {}
+        with self._lock:
+            entry = self.stages.setdefault(stage, {
+                "calls": 0, "seconds": 0.0, "input_tokens": 0, "output_tokens": 0, "cache_read": 0, "cache_creation": 0
+            })
+            entry["calls"] += 1
+            entry["seconds"] += seconds
+            entry["input_tokens"] += usage.get("input_tokens", 0)
+            entry["output_tokens"] += usage.get("output_tokens", 0)
+            entry["cache_read"] += details.get("cache_read") or 0
+            entry["cache_creation"] += details.get("cache_creation") or 0
+
+    def report(self) -> str:
+        """Table of calls, mean latency, cached input share and cache writes per stage"""
+        lines = [f"{'stage':<40} {'calls':>5} {'mean (s)':>9} {'input':>8} {'cached':>8} {'ratio':>6} {'written':>8}"]
+        totals = {"input_tokens": 0, "cache_read": 0, "cache_creation": 0}
+        with self._lock:
+            for stage, entry in self.stages.items():
+                ratio = entry["cache_read"] / entry["input_tokens"] if entry["input_tokens"] else 0.0
+                lines.append(
+                    f"{stage:<40} {entry['calls']:>5} {entry['seconds'] / entry['calls']:>9.2f} "
+                    f"{entry['input_tokens']:>8} {entry['cache_read']:>8} {ratio:>6.0%} {entry['cache_creation']:>8}"
+                )
+                totals["input_tokens"] += entry["input_tokens"]
+                totals["cache_read"] += entry["cache_read"]
+                totals["cache_creation"] += entry["cache_creation"]
+        if totals["input_tokens"]:
+            lines.append(f"cached input tokens overall: {totals['cache_read'] / totals['input_tokens']:.0%}")
+        if totals["cache_creation"]:
+            lines.append(f"tokens written to the prompt cache: {totals['cache_creation']}")
+        return "\n".join(lines)
@@ -0,0 +1,124 @@
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+from langchain_core.output_parsers import StrOutputParser
+from typing import Optional
+import threading
+
+from .backends import DEFAULT_MODELS, create_chat_model, get_backend
+from .llm_cache import get_response_cache
+from .metrics import stage_config
+
+
+class ChainFactory:
+    """Model client and runnables shared by every bot in the process
+
+    The prompts and chains hold no per-session state, so they are built
+    once here instead of in every CuriousPeerBot. The model client is
+    created on first use and then reused, so all sessions share its HTTP
+    connection pool and keep-alive connections. Per-session callbacks
+    (usage tracking) are passed at call time; every chain carries the
+    metrics callback and the name of the stage it serves.
+    """
+
+    def __init__(self, chat_model=None, model_name: Optional[str] = None, backend: Optional[str] = None):
+        self.backend = backend or get_backend()
+        self.model_name = model_name or DEFAULT_MODELS[self.backend]
+        self._chat_model = chat_model
+        self._lock = threading.Lock()
+        self.output_parser = StrOutputParser()
+
+        self.chat_prompt = ChatPromptTemplate.from_messages([
+            MessagesPlaceholder(variable_name="context"),
+            MessagesPlaceholder(variable_name="chat_history"),
+            ("human", "{input}")
+        ])
+        self.tldr_prompt = ChatPromptTemplate.from_messages([
+            ("system", "You are an expert at summarizing academic articles concisely."),
+            ("human", "Please provide a TLDR summary of the following academic article. "
+                     "Focus on the main findings, methodology, and significance. "
+                     "Use bullet points for clarity:\n\n{text}")
+        ])
+        self.tldr_map_prompt = ChatPromptTemplate.from_messages([
+            ("system", "You are an expert at summarizing academic articles concisely."),
+            ("human", "The following is part {part} of {parts} of an academic article. "
+                     "Summarize the findings, methods, data and claims it contains, "
+                     "keeping key numbers and terminology:\n\n{text}")
+        ])
+        self.tldr_reduce_prompt = ChatPromptTemplate.from_messages([
+            ("system", "You are an expert at summarizing academic articles concisely."),
+            ("human", "Below are summaries of consecutive parts of one academic article. "
+                     "Please combine them into a TLDR summary of the whole article. "
+                     "Focus on the main findings, methodology, and significance. "
+                     "Use bullet points for clarity:\n\n{text}")
+        ])
+        self.history_summary_prompt = ChatPromptTemplate.from_messages([
+            ("system", "You maintain a running summary of a study discussion about an academic article."),
+            ("human", "Update the summary below with the new part of the conversation. "
+                     "Keep the questions raised, ideas the student proposed, and open threads. "
+                     "Be concise.\n\nCurrent summary:\n{summary}\n\nNew conversation:\n{conversation}")
+        ])
+        self._chains = None
+
+    @property
+    def chat_model(self):
+        """The shared chat model, created on first access"""
+        if self._chat_model is None:
+            with self._lock:
+                if self._chat_model is None:
+                    self._chat_model = create_chat_model(
+                        self.backend,
+                        self.model_name,
+                        temperature=0.7,
+                        max_tokens=4096,
+                        cache=get_response_cache()
+                    )
+        return self._chat_model
+
+    def _build(self):
+        if self._chains is None:
+            model = self.chat_model
+            with self._lock:
+                if self._chains is None:
+                    self._chains = {
+                        name: (prompt | model | self.output_parser).with_config(stage_config(stage))
+                        for name, stage, prompt in (
+                            ("chat", "chat", self.chat_prompt),
+                            ("tldr", "generate_tldr", self.tldr_prompt),
+                            ("tldr_map", "generate_tldr_map", self.tldr_map_prompt),
+                            ("tldr_reduce", "generate_tldr", self.tldr_reduce_prompt),
+                            ("history_summary", "summarize_history", self.history_summary_prompt),
+                        )
+                    }
+        return self._chains
+
+    @property
+    def chat_chain(self):
+        return self._build()["chat"]
+
+    @property
+    def tldr_chain(self):
+        return self._build()["tldr"]
+
+    @property
+    def tldr_map_chain(self):
+        return self._build()["tldr_map"]
+
+    @property
+    def tldr_reduce_chain(self):
+        return self._build()["tldr_reduce"]
+
+    @property
+    def history_summary_chain(self):
+        return self._build()["history_summary"]
+
+
+_chain_factory: Optional[ChainFactory] = None
+_chain_factory_lock = threading.Lock()
+
+
+def get_chain_factory() -> ChainFactory:
+    """Return the process-wide chain factory"""
+    global _chain_factory
+    with _chain_factory_lock:
+        if _chain_factory is None:
+            _chain_factory = ChainFactory()
+        return _chain_factory
@@ -0,0 +1,159 @@
+"""
+Deterministic local chat model for benchmarks and offline runs
+
+FakeChatModel needs no network or API key. It waits `latency` seconds
+(time to first token) and then produces `reply_tokens` words at
+`tokens_per_second`, streamed word by word when streaming. Structured
+output calls (`with_structured_output`) are answered with a tool call whose
+arguments come from `canned_json`, keyed by schema name, so the assessment
+and quality-check stages parse exactly as they would with a real model.
+Token usage is reported like the real providers (input estimated at four
+characters per token), so usage tracking and metrics keep working.
+"""
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.utils.function_calling import convert_to_openai_tool
+from pydantic import Field
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
+import asyncio
+import json
+import os
+import time
+
+from .structured import message_text
+
+# Replies to the structured-output stages of the article bots
+DEFAULT_CANNED_JSON: Dict[str, Dict[str, Any]] = {
+    "Assessment": {
+        "scores": {"concept": 4, "main_points": 4, "explanation": 4},
+        "total": 12,
+        "feedback": "The answer identifies the main claim and the key terms.",
+        "areas_for_improvement": ["How the evidence supports the main claim"],
+        "remedial_questions": [],
+    },
+    "QualityCheck": {
+        "quality": "sufficient",
+        "feedback": "The answer engages with the question.",
+        "suggested_followup": None,
+    },
+}
+
+_WORDS = (
+    "The article argues that peer discussion improves understanding because students "
+    "explain their reasoning, notice gaps and compare alternative interpretations of the evidence."
+).split()
+
+
+class FakeChatModel(BaseChatModel):
+    """Chat model with configurable latency, token rate and canned structured replies"""
+
+    model_name: str = "fake-peer-model"
+    latency: float = 0.2
+    tokens_per_second: float = 50.0
+    reply_tokens: int = 60
+    temperature: float = 0.7
+    max_tokens: Optional[int] = None
+    canned_json: Dict[str, Dict[str, Any]] = Field(default_factory=lambda: dict(DEFAULT_CANNED_JSON))
+
+    @classmethod
+    def from_env(cls, **kwargs: Any) -> "FakeChatModel":
+        """Configure from FAKE_LLM_LATENCY, FAKE_LLM_TOKENS_PER_SECOND,
+        FAKE_LLM_REPLY_TOKENS and FAKE_LLM_CANNED_JSON (a JSON file of
+        replies by schema name, merged over the defaults)"""
+        canned = dict(DEFAULT_CANNED_JSON)
+        path = os.getenv("FAKE_LLM_CANNED_JSON")
+        if path:
+            with open(path, "r") as f:
+                canned.update(json.load(f))
+        settings = {
+            "latency": float(os.getenv("FAKE_LLM_LATENCY", "0.2")),
+            "tokens_per_second": float(os.getenv("FAKE_LLM_TOKENS_PER_SECOND", "50")),
+            "reply_tokens": int(os.getenv("FAKE_LLM_REPLY_TOKENS", "60")),
+            "canned_json": canned,
+        }
+        settings.update(kwargs)
+        return cls(**settings)
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-peer-model"
+
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        return {
+            "model_name": self.model_name,
+            "latency": self.latency,
+            "tokens_per_second": self.tokens_per_second,
+            "reply_tokens": self.reply_tokens,
+        }
+
+    def bind_tools(self, tools, tool_choice=None, **kwargs: Any):
+        return self.bind(tools=[convert_to_openai_tool(tool) for tool in tools], **kwargs)
+
+    def _reply(self, messages: List[BaseMessage], tools: Optional[List[Dict[str, Any]]]) -> AIMessage:
+        """The full reply, with token usage but no timing"""
+        input_tokens = sum(len(message_text(m)) for m in messages) // 4 + 1
+        if tools:
+            name = tools[0]["function"]["name"]
+            if name not in self.canned_json:
+                raise ValueError(f"No canned JSON for schema {name!r}")
+            args = self.canned_json[name]
+            output_tokens = len(json.dumps(args)) // 4 + 1
+            message = AIMessage(content="", tool_calls=[{"name": name, "args": args, "id": "call_fake", "type": "tool_call"}])
+        else:
+            output_tokens = self.reply_tokens if self.max_tokens is None else min(self.reply_tokens, self.max_tokens)
+            message = AIMessage(content=" ".join(_WORDS[i % len(_WORDS)] for i in range(output_tokens)))
+        message.usage_metadata = {
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "total_tokens": input_tokens + output_tokens,
+        }
+        return message
+
+    def _duration(self, message: AIMessage) -> float:
+        return self.latency + message.usage_metadata["output_tokens"] / self.tokens_per_second
+
+    def _generate(self, messages: List[BaseMessage], stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        message = self._reply(messages, kwargs.get("tools"))
+        time.sleep(self._duration(message))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        message = self._reply(messages, kwargs.get("tools"))
+        await asyncio.sleep(self._duration(message))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _chunks(self, message: AIMessage) -> List[ChatGenerationChunk]:
+        if message.tool_calls:
+            return [ChatGenerationChunk(message=AIMessageChunk(
+                content="", tool_call_chunks=[{
+                    "name": call["name"], "args": json.dumps(call["args"]), "id": call["id"], "index": 0
+                } for call in message.tool_calls],
+                usage_metadata=message.usage_metadata
+            ))]
+        words = message.content.split(" ")
+        chunks = [
+            ChatGenerationChunk(message=AIMessageChunk(content=word if i == 0 else " " + word))
+            for i, word in enumerate(words)
+        ]
+        chunks[-1].message.usage_metadata = message.usage_metadata
+        return chunks
+
+    def _stream(self, messages: List[BaseMessage], stop=None, run_manager=None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        message = self._reply(messages, kwargs.get("tools"))
+        time.sleep(self.latency)
+        for chunk in self._chunks(message):
+            time.sleep(1 / self.tokens_per_second)
+            if run_manager:
+                run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+    async def _astream(self, messages: List[BaseMessage], stop=None, run_manager=None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        message = self._reply(messages, kwargs.get("tools"))
+        await asyncio.sleep(self.latency)
+        for chunk in self._chunks(message):
+            await asyncio.sleep(1 / self.tokens_per_second)
+            if run_manager:
+                await run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
@@ -0,0 +1,187 @@
+from langchain_core.messages import HumanMessage, AIMessage, BaseMessage
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Dict, Optional, Tuple
+import threading
+
+# Summaries are produced off the request path on this shared pool
+_summary_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="history-summary")
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about 4 characters per token)"""
+    return len(text) // 4 + 1
+
+
+class ChatRecord:
+    """A single chat turn, holding both its raw text and its prompt message"""
+    __slots__ = ("role", "content", "message", "tokens")
+
+    def __init__(self, role: str, content: str):
+        self.role = role
+        self.content = content
+        self.message = HumanMessage(content=content) if role == "user" else AIMessage(content=content)
+        self.tokens = estimate_tokens(content)
+
+    def as_dict(self) -> Dict[str, str]:
+        return {"role": self.role, "content": self.content}
+
+
+class MessageStore:
+    """Append-only chat transcript
+
+    Each message is converted once, when it is appended, so building the
+    prompt for the next turn does not re-walk the whole history. The store
+    also tracks a window: messages before `window_start` have been folded
+    into a summary and are no longer sent to the model, but remain in the
+    transcript.
+    """
+
+    def __init__(self):
+        self._records: List[ChatRecord] = []
+        self._messages: List[BaseMessage] = []
+        self._dicts: List[Dict[str, str]] = []
+        self.total_tokens = 0
+        # (window_start, summary text, summary message, summary tokens), swapped as one object
+        self._window = (0, None, None, 0)
+
+    def append(self, role: str, content: str) -> ChatRecord:
+        """Append a message to the transcript"""
+        record = ChatRecord(role, content)
+        self._records.append(record)
+        self._messages.append(record.message)
+        self._dicts.append(record.as_dict())
+        self.total_tokens += record.tokens
+        return record
+
+    def add_turn(self, user_input: str, response: str) -> None:
+        """Append a completed user/assistant exchange"""
+        self.append("user", user_input)
+        self.append("assistant", response)
+
+    @property
+    def messages(self) -> List[BaseMessage]:
+        """All messages, ready for MessagesPlaceholder (do not mutate)"""
+        return self._messages
+
+    @property
+    def window_start(self) -> int:
+        return self._window[0]
+
+    @property
+    def summary(self) -> Optional[str]:
+        return self._window[1]
+
+    def window(self) -> Tuple[int, Optional[str]]:
+        """(window_start, summary) read together, consistent with each other"""
+        start, summary, _, _ = self._window
+        return start, summary
+
+    def window_messages(self) -> List[BaseMessage]:
+        """Summary of folded turns (if any) followed by the unfolded messages"""
+        start, _, summary_message, _ = self._window
+        if summary_message is None:
+            return self._messages[start:]
+        return [summary_message] + self._messages[start:]
+
+    def window_tokens(self) -> int:
+        """Estimated tokens in window_messages()"""
+        start, _, _, summary_tokens = self._window
+        return summary_tokens + sum(r.tokens for r in self._records[start:])
+
+    def fold(self, upto: int, summary: str) -> None:
+        """Replace messages before `upto` with a summary in the window"""
+        summary_message = HumanMessage(content=f"[Summary of our earlier discussion]\n{summary}")
+        self._window = (upto, summary, summary_message, estimate_tokens(summary_message.content))
+
+    def as_dicts(self) -> List[Dict[str, str]]:
+        """Transcript as role/content dicts (do not mutate)"""
+        return self._dicts
+
+    def records(self, start: int, end: int) -> List[ChatRecord]:
+        return self._records[start:end]
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def __iter__(self):
+        return iter(self._records)
+
+
+class HistoryCompactor:
+    """Keep the prompt history under a token budget with a rolling summary
+
+    Once the window grows past `token_budget`, every message except the
+    most recent `keep_recent_turns` exchanges is folded into a running
+    summary. Summaries are generated in the background, so the turn that
+    crosses the budget is not slowed down; the fold is applied as soon as
+    the summary is ready.
+    """
+
+    def __init__(
+        self,
+        store: MessageStore,
+        summarize: Callable[[Optional[str], List[ChatRecord]], str],
+        token_budget: int = 8000,
+        keep_recent_turns: int = 4
+    ):
+        self.store = store
+        self.summarize = summarize
+        self.token_budget = token_budget
+        self.keep_recent_turns = keep_recent_turns
+
+        self.compactions = 0
+        self.tokens_saved = 0
+        self._lock = threading.Lock()
+        self._pending = None
+
+    def messages(self) -> List[BaseMessage]:
+        """Messages to send for the next turn"""
+        messages = self.store.window_messages()
+        self.tokens_saved += max(0, self.store.total_tokens - self.store.window_tokens())
+        return messages
+
+    def maybe_compact(self) -> None:
+        """Schedule a background fold if the window is over budget"""
+        with self._lock:
+            if self._pending is not None or self.store.window_tokens() <= self.token_budget:
+                return
+            start = self.store.window_start
+            upto = len(self.store) - 2 * self.keep_recent_turns
+            if upto <= start:
+                return
+            self._pending = _summary_executor.submit(self._compact, start, upto)
+
+    def _compact(self, start: int, upto: int) -> None:
+        folded = False
+        try:
+            summary = self.summarize(self.store.summary, self.store.records(start, upto))
+            with self._lock:
+                self.store.fold(upto, summary)
+                self.compactions += 1
+            folded = True
+        except Exception as e:
+            print(f"History summarization failed: {e}")
+        finally:
+            with self._lock:
+                self._pending = None
+            # Turns appended during the fold were not checked against the
+            # budget; check again now (not after a failure, to avoid a retry loop)
+            if folded:
+                self.maybe_compact()
+
+    def wait(self) -> None:
+        """Block until any in-flight summarization, and any it schedules, has finished"""
+        while True:
+            pending = self._pending
+            if pending is None:
+                return
+            pending.result()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "token_budget": self.token_budget,
+            "compactions": self.compactions,
+            "tokens_saved": self.tokens_saved,
+            "window_tokens": self.store.window_tokens(),
+            "total_tokens": self.store.total_tokens,
+        }
@@ -0,0 +1,195 @@
+import contextlib
+import contextvars
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from langchain_core.caches import BaseCache, RETURN_VAL_TYPE
+from langchain_core.messages import message_to_dict, messages_from_dict
+from langchain_core.outputs import ChatGeneration, Generation
+
+
+def _dump_generations(generations: RETURN_VAL_TYPE) -> str:
+    return json.dumps([
+        {"message": message_to_dict(g.message)} if isinstance(g, ChatGeneration) else {"text": g.text}
+        for g in generations
+    ])
+
+
+def _load_generations(data: str) -> RETURN_VAL_TYPE:
+    """Stored generations, marked as cached and without token usage
+
+    A replay is not billed, so usage trackers and metrics must not count
+    the tokens of the original call again.
+    """
+    generations = []
+    for item in json.loads(data):
+        if "message" not in item:
+            generations.append(Generation(text=item["text"]))
+            continue
+        message = messages_from_dict([item["message"]])[0]
+        if hasattr(message, "usage_metadata"):
+            message.usage_metadata = None
+        message.response_metadata = {**message.response_metadata, "from_cache": True}
+        generations.append(ChatGeneration(message=message))
+    return generations
+
+
+# Set by bypass_response_cache() for the calls made inside it
+_bypass = contextvars.ContextVar("bypass_response_cache", default=False)
+
+
+@contextlib.contextmanager
+def bypass_response_cache():
+    """Neither read nor write the response cache for model calls in this block"""
+    token = _bypass.set(True)
+    try:
+        yield
+    finally:
+        _bypass.reset(token)
+
+
+class SQLiteResponseCache(BaseCache):
+    """Persistent LangChain response cache backed by SQLite
+
+    Keys hash the model's invocation parameters (model name, temperature,
+    max tokens, ...) together with the fully rendered prompt. Entries
+    expire after `ttl_seconds`, and once there are more than `max_entries`
+    the least recently used ones are dropped. The database runs in WAL
+    mode with one connection per thread, so it can be shared by threads
+    and by several processes.
+    """
+
+    def __init__(self, path: str = "_cache/responses.sqlite3", ttl_seconds: float = 7 * 86400, max_entries: int = 10000):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY,"
+            " response TEXT NOT NULL,"
+            " created REAL NOT NULL,"
+            " last_access REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)")
+        conn.commit()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _key(prompt: str, llm_string: str) -> str:
+        return hashlib.sha256(f"{llm_string}\0{prompt}".encode("utf-8")).hexdigest()
+
+    def _count(self, counter: str) -> None:
+        with self._stats_lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        if _bypass.get():
+            self._count("bypassed")
+            return None
+        key = self._key(prompt, llm_string)
+        conn = self._conn()
+        now = time.time()
+        row = conn.execute(
+            "SELECT response FROM responses WHERE key = ? AND created >= ?",
+            (key, now - self.ttl_seconds)
+        ).fetchone()
+        if row is None:
+            self._count("misses")
+            return None
+        conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+        conn.commit()
+        self._count("hits")
+        return _load_generations(row[0])
+
+    def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        if _bypass.get():
+            return
+        now = time.time()
+        conn = self._conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO responses (key, response, created, last_access) VALUES (?, ?, ?, ?)",
+            (self._key(prompt, llm_string), _dump_generations(return_val), now, now)
+        )
+        conn.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl_seconds,))
+        conn.execute(
+            "DELETE FROM responses WHERE key IN ("
+            " SELECT key FROM responses ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,)
+        )
+        conn.commit()
+
+    def clear(self, **kwargs: Any) -> None:
+        conn = self._conn()
+        conn.execute("DELETE FROM responses")
+        conn.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "bypassed": self.bypassed,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+_response_cache: Optional[SQLiteResponseCache] = None
+_response_cache_lock = threading.Lock()
+
+
+def get_response_cache() -> Optional[SQLiteResponseCache]:
+    """Return the process-wide response cache, or None unless LLM_CACHE_PATH is set
+
+    Pass the result as `cache=` when constructing a chat model; with None
+    the model does not cache.
+    """
+    global _response_cache
+    path = os.getenv("LLM_CACHE_PATH")
+    if not path:
+        return None
+    with _response_cache_lock:
+        if _response_cache is None:
+            _response_cache = SQLiteResponseCache(
+                path,
+                ttl_seconds=float(os.getenv("LLM_CACHE_TTL_SECONDS", str(7 * 86400))),
+                max_entries=int(os.getenv("LLM_CACHE_MAX_ENTRIES", "10000"))
+            )
+            _register_metrics(_response_cache)
+        return _response_cache
+
+
+def _register_metrics(cache: SQLiteResponseCache) -> None:
+    from .metrics import get_metrics
+
+    metrics = get_metrics()
+    metrics.add_collector(
+        "llm_response_cache_lookups_total", "counter", "Response cache lookups by result",
+        lambda: {(("result", result),): value for result, value in cache.stats().items() if result != "hit_rate"}
+    )
+    metrics.add_collector(
+        "llm_response_cache_hit_ratio", "gauge", "Share of response cache lookups that were hits",
+        lambda: {(): cache.stats()["hit_rate"]}
+    )
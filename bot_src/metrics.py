@@ -0,0 +1,253 @@
+"""
+In-process latency, token and cost metrics in Prometheus text format
+
+MetricsCallback is attached to every chain and records, per stage, each
+model call's latency, time to first token (for streamed calls), input and
+output tokens and estimated cost. The stage is read from the run metadata
+(`{"metadata": {"stage": ...}}` in the chain config). Non-model stages such
+as PDF extraction are timed with `get_metrics().observe_stage()`.
+
+Recording a value is a bisect and a few additions under a lock; nothing is
+formatted until `render()` is called by the metrics endpoint.
+"""
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+from bisect import bisect_left
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+from uuid import UUID
+import threading
+import time
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 15.0, 30.0, 60.0)
+TOKEN_BUCKETS = (16, 64, 256, 512, 1024, 2048, 4096, 8192, 16384, 32768, 65536)
+
+# USD per million tokens: input, output, cache read, cache write
+MODEL_PRICES = {
+    "claude-3-5-sonnet-20241022": (3.0, 15.0, 0.30, 3.75),
+    "claude-3-5-haiku-20241022": (0.80, 4.0, 0.08, 1.0),
+    "gpt-4o": (2.50, 10.0, 1.25, 2.50),
+    "gpt-4o-mini": (0.15, 0.60, 0.075, 0.15),
+}
+
+
+class Histogram:
+    """Cumulative-bucket histogram, as Prometheus expects"""
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        # Caller holds the registry lock
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self) -> List[Tuple[str, int]]:
+        total = 0
+        result = []
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            total += count
+            result.append(("+Inf" if bound == float("inf") else repr(bound), total))
+        return result
+
+
+def _labels(labels: Tuple[Tuple[str, str], ...]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels) + "}"
+
+
+class MetricsRegistry:
+    """Histograms and counters keyed by metric name and labels"""
+
+    HISTOGRAMS = {
+        "llm_request_duration_seconds": ("Model call latency per stage", LATENCY_BUCKETS),
+        "llm_time_to_first_token_seconds": ("Time to first streamed token per stage", LATENCY_BUCKETS),
+        "llm_input_tokens": ("Input tokens per model call", TOKEN_BUCKETS),
+        "llm_output_tokens": ("Output tokens per model call", TOKEN_BUCKETS),
+        "stage_duration_seconds": ("Duration of non-model stages such as PDF extraction", LATENCY_BUCKETS),
+    }
+    COUNTERS = {
+        "llm_requests_total": "Model calls per stage",
+        "llm_errors_total": "Failed model calls per stage",
+        "llm_tokens_total": "Tokens per stage and kind",
+        "llm_cost_usd_total": "Estimated model cost in USD",
+        "llm_cached_responses_total": "Model calls answered from the response cache per stage",
+    }
+
+    def __init__(self):
+        self._histograms: Dict[str, Dict[Tuple, Histogram]] = {name: {} for name in self.HISTOGRAMS}
+        self._counters: Dict[str, Dict[Tuple, float]] = {name: {} for name in self.COUNTERS}
+        # name -> (type, help, read); read() returns {labels dict as tuple: value}
+        self._collectors: Dict[str, Tuple[str, str, Callable[[], Dict[Tuple, float]]]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._histograms[name]
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = Histogram(self.HISTOGRAMS[name][1])
+            histogram.observe(value)
+
+    def inc(self, name: str, value: float = 1.0, **labels: str) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._counters[name]
+            series[key] = series.get(key, 0.0) + value
+
+    def observe_stage(self, stage: str, seconds: float) -> None:
+        self.observe("stage_duration_seconds", seconds, stage=stage)
+
+    def add_collector(self, name: str, metric_type: str, help_text: str, read: Callable[[], Dict[Tuple, float]]) -> None:
+        """Report values owned by another component (caches, session pool, ...)
+
+        `read` is called on every render and returns a value per label set,
+        e.g. `{(("result", "hit"),): 3, (("result", "miss"),): 1}`; `()` is
+        the key of an unlabelled value. Registering a name again replaces it.
+        """
+        with self._lock:
+            self._collectors[name] = (metric_type, help_text, read)
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            for name, (help_text, _) in self.HISTOGRAMS.items():
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} histogram")
+                for key, histogram in self._histograms[name].items():
+                    for bound, count in histogram.cumulative():
+                        lines.append(f"{name}_bucket{_labels(key + (('le', bound),))} {count}")
+                    lines.append(f"{name}_sum{_labels(key)} {histogram.sum}")
+                    lines.append(f"{name}_count{_labels(key)} {histogram.count}")
+            for name, help_text in self.COUNTERS.items():
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} counter")
+                for key, value in self._counters[name].items():
+                    lines.append(f"{name}{_labels(key)} {value}")
+            collectors = list(self._collectors.items())
+        # Collectors take their own locks, so read them outside ours
+        for name, (metric_type, help_text, read) in collectors:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            for key, value in read().items():
+                lines.append(f"{name}{_labels(key)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def estimate_cost(model: Optional[str], usage: Dict[str, Any]) -> float:
+    """USD cost of one call, or 0 for models without a known price"""
+    prices = MODEL_PRICES.get(model or "")
+    if prices is None:
+        return 0.0
+    input_price, output_price, cache_read_price, cache_write_price = prices
+    details = usage.get("input_token_details") or {}
+    cache_read = details.get("cache_read") or 0
+    cache_write = details.get("cache_creation") or 0
+    uncached = max(usage.get("input_tokens", 0) - cache_read - cache_write, 0)
+    return (
+        uncached * input_price
+        + cache_read * cache_read_price
+        + cache_write * cache_write_price
+        + usage.get("output_tokens", 0) * output_price
+    ) / 1_000_000
+
+
+class MetricsCallback(BaseCallbackHandler):
+    """Record latency, time to first token, tokens and cost of each model call"""
+
+    # Runs in the caller's thread/event loop instead of a thread pool hop
+    run_inline = True
+
+    def __init__(self, registry: MetricsRegistry):
+        self.registry = registry
+        # run_id -> [stage, model, start, first token time]
+        self._runs: Dict[UUID, List[Any]] = {}
+
+    def _start(self, run_id: UUID, metadata: Optional[Dict[str, Any]]) -> None:
+        metadata = metadata or {}
+        self._runs[run_id] = [metadata.get("stage", "unknown"), metadata.get("ls_model_name"), time.perf_counter(), None]
+
+    def on_chat_model_start(self, serialized, messages, *, run_id: UUID, metadata=None, **kwargs: Any) -> None:
+        self._start(run_id, metadata)
+
+    def on_llm_start(self, serialized, prompts, *, run_id: UUID, metadata=None, **kwargs: Any) -> None:
+        self._start(run_id, metadata)
+
+    def on_llm_new_token(self, token: str, *, run_id: UUID, **kwargs: Any) -> None:
+        run = self._runs.get(run_id)
+        if run is not None and run[3] is None:
+            run[3] = time.perf_counter()
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        run = self._runs.pop(run_id, None)
+        if run is None:
+            return
+        stage, model, start, first_token = run
+        registry = self.registry
+        if any(getattr(g, "message", None) is not None and g.message.response_metadata.get("from_cache")
+               for generations in response.generations for g in generations):
+            # A replay costs nothing and says nothing about model latency
+            registry.inc("llm_cached_responses_total", stage=stage)
+            return
+        registry.observe("llm_request_duration_seconds", time.perf_counter() - start, stage=stage)
+        if first_token is not None:
+            registry.observe("llm_time_to_first_token_seconds", first_token - start, stage=stage)
+        registry.inc("llm_requests_total", stage=stage)
+
+        for generations in response.generations:
+            for generation in generations:
+                message = getattr(generation, "message", None)
+                usage = getattr(message, "usage_metadata", None)
+                if not usage:
+                    continue
+                registry.observe("llm_input_tokens", usage.get("input_tokens", 0), stage=stage)
+                registry.observe("llm_output_tokens", usage.get("output_tokens", 0), stage=stage)
+                registry.inc("llm_tokens_total", usage.get("input_tokens", 0), stage=stage, kind="input")
+                registry.inc("llm_tokens_total", usage.get("output_tokens", 0), stage=stage, kind="output")
+                details = usage.get("input_token_details") or {}
+                if details.get("cache_read"):
+                    registry.inc("llm_tokens_total", details["cache_read"], stage=stage, kind="cache_read")
+                cost = estimate_cost(model, usage)
+                if cost:
+                    registry.inc("llm_cost_usd_total", cost, stage=stage, model=model)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        run = self._runs.pop(run_id, None)
+        if run is not None:
+            self.registry.inc("llm_errors_total", stage=run[0])
+
+
+_metrics: Optional[MetricsRegistry] = None
+_metrics_callback: Optional[MetricsCallback] = None
+_metrics_lock = threading.Lock()
+
+
+def get_metrics() -> MetricsRegistry:
+    """Return the process-wide metrics registry"""
+    global _metrics
+    with _metrics_lock:
+        if _metrics is None:
+            _metrics = MetricsRegistry()
+        return _metrics
+
+
+def get_metrics_callback() -> MetricsCallback:
+    """Return the callback recording into the process-wide registry"""
+    global _metrics_callback
+    registry = get_metrics()
+    with _metrics_lock:
+        if _metrics_callback is None:
+            _metrics_callback = MetricsCallback(registry)
+        return _metrics_callback
+
+
+def stage_config(stage: str) -> Dict[str, Any]:
+    """Run config that attaches the metrics callback and names the stage"""
+    return {"callbacks": [get_metrics_callback()], "metadata": {"stage": stage}}
@@ -0,0 +1,194 @@
+"""
+System prompt registry with hot reload and A/B routing
+
+Every `sys_prompt*.txt` file next to this module is a prompt variant named
+after the file (`sys_prompt`, `sys_prompt00`, ...). Prompts are read once
+and re-read only when the file changes on disk, so editing a prompt takes
+effect on the next turn of every session without a restart. A configurable
+fraction of new sessions is routed to an alternative variant, and each
+turn's latency and token usage is recorded per variant and version.
+"""
+import glob
+import hashlib
+import os
+import random
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+PROMPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_VARIANT = "sys_prompt"
+
+
+class PromptVersion:
+    """One loaded revision of a prompt file"""
+    __slots__ = ("variant", "text", "version", "mtime")
+
+    def __init__(self, variant: str, text: str, mtime: float):
+        self.variant = variant
+        self.text = text
+        # Content hash, so identical text keeps its version across reloads
+        self.version = hashlib.sha256(text.encode("utf-8")).hexdigest()[:12]
+        self.mtime = mtime
+
+    @property
+    def label(self) -> str:
+        return f"{self.variant}@{self.version}"
+
+
+class PromptRegistry:
+    """Loads prompt variants, reloads them when they change and routes sessions between them
+
+    `get()` checks a file's modification time at most every
+    `reload_interval` seconds. A reload replaces the variant's
+    PromptVersion in one assignment, so a turn sees either the old or the
+    new prompt, never a mix.
+    """
+
+    def __init__(
+        self,
+        directory: str = PROMPT_DIR,
+        default_variant: str = DEFAULT_VARIANT,
+        ab_variant: Optional[str] = None,
+        ab_fraction: float = 0.0,
+        reload_interval: float = 2.0
+    ):
+        self.directory = directory
+        self.default_variant = default_variant
+        self.ab_variant = ab_variant
+        self.ab_fraction = ab_fraction
+        self.reload_interval = reload_interval
+
+        self._paths: Dict[str, str] = {}
+        self._versions: Dict[str, PromptVersion] = {}
+        self._checked: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self.reloads = 0
+        # (variant, version) -> turns, seconds, input/output/cached tokens
+        self._turns: Dict[Tuple[str, str], Dict[str, float]] = {}
+
+        for path in sorted(glob.glob(os.path.join(directory, "sys_prompt*.txt"))):
+            self._paths[os.path.splitext(os.path.basename(path))[0]] = path
+        if default_variant not in self._paths:
+            raise ValueError(f"No prompt file for default variant {default_variant!r} in {directory}")
+        if ab_variant is not None and ab_variant not in self._paths:
+            raise ValueError(f"No prompt file for A/B variant {ab_variant!r} in {directory}")
+
+    def variants(self):
+        return list(self._paths)
+
+    def _load(self, variant: str) -> PromptVersion:
+        path = self._paths[variant]
+        mtime = os.path.getmtime(path)
+        with open(path, "r") as f:
+            text = f.read()
+        return PromptVersion(variant, text, mtime)
+
+    def get(self, variant: Optional[str] = None) -> PromptVersion:
+        """Current version of a variant, reloading it if the file changed"""
+        variant = variant or self.default_variant
+        now = time.monotonic()
+        current = self._versions.get(variant)
+        if current is not None and now - self._checked.get(variant, 0.0) < self.reload_interval:
+            return current
+
+        with self._lock:
+            current = self._versions.get(variant)
+            self._checked[variant] = now
+            try:
+                if current is None or os.path.getmtime(self._paths[variant]) != current.mtime:
+                    loaded = self._load(variant)
+                    if current is not None and loaded.version != current.version:
+                        self.reloads += 1
+                        print(f"Prompt reloaded: {current.label} -> {loaded.label}")
+                    self._versions[variant] = current = loaded
+            except OSError as e:
+                # Keep serving the last good version while the file is being replaced
+                if current is None:
+                    raise
+                print(f"Prompt reload failed for {variant}: {e}")
+        return current
+
+    def assign_variant(self) -> str:
+        """Pick the variant for a new session"""
+        if self.ab_variant is not None and random.random() < self.ab_fraction:
+            return self.ab_variant
+        return self.default_variant
+
+    def record_turn(self, prompt: PromptVersion, seconds: float, usage: Optional[Dict[str, Any]] = None) -> None:
+        """Record latency and token usage of a turn served by `prompt`"""
+        usage = usage or {}
+        with self._lock:
+            entry = self._turns.setdefault((prompt.variant, prompt.version), {
+                "turns": 0, "seconds": 0.0, "input_tokens": 0, "output_tokens": 0, "cache_read": 0
+            })
+            entry["turns"] += 1
+            entry["seconds"] += seconds
+            entry["input_tokens"] += usage.get("input_tokens", 0)
+            entry["output_tokens"] += usage.get("output_tokens", 0)
+            entry["cache_read"] += usage.get("cache_read", 0)
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """Per variant@version: turns, mean latency and mean tokens per turn"""
+        with self._lock:
+            return {
+                f"{variant}@{version}": {
+                    "turns": entry["turns"],
+                    "mean_seconds": entry["seconds"] / entry["turns"],
+                    "mean_input_tokens": entry["input_tokens"] / entry["turns"],
+                    "mean_output_tokens": entry["output_tokens"] / entry["turns"],
+                    "mean_cache_read": entry["cache_read"] / entry["turns"],
+                }
+                for (variant, version), entry in self._turns.items()
+            }
+
+
+# /metrics gauge -> PromptRegistry.stats() field
+PROMPT_METRICS = {
+    "prompt_turns": ("turns", "Chat turns per prompt variant and version"),
+    "prompt_turn_seconds_mean": ("mean_seconds", "Mean chat turn latency per prompt variant and version"),
+    "prompt_input_tokens_mean": ("mean_input_tokens", "Mean input tokens per turn per prompt variant and version"),
+    "prompt_output_tokens_mean": ("mean_output_tokens", "Mean output tokens per turn per prompt variant and version"),
+    "prompt_cache_read_tokens_mean": ("mean_cache_read", "Mean cache-read input tokens per turn per prompt variant and version"),
+}
+
+
+def _register_metrics(registry: PromptRegistry) -> None:
+    """Report the per-version turn stats at /metrics, labelled by variant and version"""
+    from .metrics import get_metrics
+
+    def reader(field: str):
+        def read() -> Dict[Tuple, float]:
+            values = {}
+            for label, entry in registry.stats().items():
+                variant, version = label.split("@", 1)
+                values[(("prompt_variant", variant), ("prompt_version", version))] = entry[field]
+            return values
+        return read
+
+    metrics = get_metrics()
+    for name, (field, help_text) in PROMPT_METRICS.items():
+        metrics.add_collector(name, "gauge", help_text, reader(field))
+
+
+_prompt_registry: Optional[PromptRegistry] = None
+_prompt_registry_lock = threading.Lock()
+
+
+def get_prompt_registry() -> PromptRegistry:
+    """Return the process-wide prompt registry, configured from the environment
+
+    PROMPT_AB_VARIANT names the alternative variant (e.g. `sys_prompt00`)
+    and PROMPT_AB_FRACTION the share of new sessions routed to it.
+    PROMPT_RELOAD_INTERVAL sets how often prompt files are checked.
+    """
+    global _prompt_registry
+    with _prompt_registry_lock:
+        if _prompt_registry is None:
+            _prompt_registry = PromptRegistry(
+                ab_variant=os.getenv("PROMPT_AB_VARIANT") or None,
+                ab_fraction=float(os.getenv("PROMPT_AB_FRACTION", "0")),
+                reload_interval=float(os.getenv("PROMPT_RELOAD_INTERVAL", "2"))
+            )
+            _register_metrics(_prompt_registry)
+        return _prompt_registry
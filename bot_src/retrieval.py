@@ -0,0 +1,129 @@
+import re
+from typing import List, Optional
+
+import numpy as np
+from scipy import sparse
+
+TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+# Numbered headings ("3 Results", "2.1. Data") or common unnumbered section
+# names. Only the section names ignore case: a numbered heading must start
+# with a capital letter and may not end like a sentence, so counts, years and
+# numbered list items ("12 participants completed the survey.") are not headings
+HEADING_PATTERN = re.compile(
+    r"^\s*(?:\d+(?:\.\d+)*\.?\s+[A-Z][^\n]{0,60}?(?<![.,;:])"
+    r"|(?i:abstract|introduction|background|related work|methods?|methodology|results|"
+    r"discussion|conclusions?|limitations|references|acknowledge?ments|appendix))\s*$"
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens"""
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+class Chunk:
+    """A passage of the article with the pages and section it came from"""
+    __slots__ = ("text", "first_page", "last_page", "section")
+
+    def __init__(self, text: str, first_page: int, last_page: int, section: Optional[str]):
+        self.text = text
+        self.first_page = first_page
+        self.last_page = last_page
+        self.section = section
+
+    def label(self) -> str:
+        pages = f"p. {self.first_page}" if self.first_page == self.last_page else f"pp. {self.first_page}-{self.last_page}"
+        return f"{pages}, {self.section}" if self.section else pages
+
+
+def chunk_pages(pages: List[str], chunk_words: int = 250, overlap_words: int = 50) -> List[Chunk]:
+    """Split page texts into overlapping chunks
+
+    Chunks never span a section heading; within a section, consecutive
+    chunks share `overlap_words` words so a passage cut at a boundary is
+    still retrievable as a whole.
+    """
+    if overlap_words >= chunk_words:
+        raise ValueError("overlap_words must be smaller than chunk_words")
+
+    chunks: List[Chunk] = []
+    section = None
+    words: List[str] = []
+    word_pages: List[int] = []
+    fresh = 0  # words not yet emitted in any chunk
+
+    def flush(keep_overlap: bool):
+        nonlocal words, word_pages, fresh
+        if fresh:
+            chunks.append(Chunk(" ".join(words), word_pages[0], word_pages[-1], section))
+        if keep_overlap:
+            words, word_pages = words[-overlap_words:], word_pages[-overlap_words:]
+        else:
+            words, word_pages = [], []
+        fresh = 0
+
+    for page_number, page in enumerate(pages, start=1):
+        for line in page.splitlines():
+            if HEADING_PATTERN.match(line):
+                flush(keep_overlap=False)
+                section = line.strip()
+            for word in line.split():
+                words.append(word)
+                word_pages.append(page_number)
+                fresh += 1
+                if len(words) >= chunk_words:
+                    flush(keep_overlap=True)
+    flush(keep_overlap=False)
+    return chunks
+
+
+class BM25Index:
+    """In-memory BM25 index over article chunks
+
+    Term weights for every (chunk, term) pair are precomputed into a sparse
+    matrix at build time, so a query is a column slice and a row sum.
+    """
+
+    def __init__(self, chunks: List[Chunk], k1: float = 1.5, b: float = 0.75):
+        self.chunks = chunks
+        vocabulary = {}
+        rows, cols = [], []
+        for doc_id, chunk in enumerate(chunks):
+            for token in tokenize(chunk.text):
+                term_id = vocabulary.setdefault(token, len(vocabulary))
+                rows.append(doc_id)
+                cols.append(term_id)
+        self.vocabulary = vocabulary
+
+        shape = (len(chunks), max(len(vocabulary), 1))
+        # Duplicate (row, col) entries are summed into term frequencies
+        tf = sparse.csr_matrix(
+            (np.ones(len(rows), dtype=np.float32), (rows, cols)), shape=shape
+        )
+        tf.sum_duplicates()
+
+        doc_len = np.asarray(tf.sum(axis=1)).ravel()
+        avg_len = doc_len.mean() if len(doc_len) else 0.0
+        doc_freq = np.bincount(tf.indices, minlength=shape[1])
+        idf = np.log(1 + (len(chunks) - doc_freq + 0.5) / (doc_freq + 0.5)).astype(np.float32)
+
+        # BM25 term weight for each stored tf entry
+        norm = k1 * (1 - b + b * doc_len / (avg_len or 1.0))
+        row_norm = np.repeat(norm, np.diff(tf.indptr)).astype(np.float32)
+        tf.data = idf[tf.indices] * tf.data * (k1 + 1) / (tf.data + row_norm)
+        self.weights = tf.tocsc()
+
+    def search(self, query: str, k: int = 5) -> List[Chunk]:
+        """Return the k chunks most relevant to the query, best first"""
+        term_ids = sorted({self.vocabulary[t] for t in tokenize(query) if t in self.vocabulary})
+        if not term_ids or not self.chunks:
+            return []
+        scores = np.asarray(self.weights[:, term_ids].sum(axis=1)).ravel()
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [self.chunks[i] for i in top if scores[i] > 0]
+
+    def __len__(self) -> int:
+        return len(self.chunks)
@@ -0,0 +1,84 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict
+
+
+class SessionPool:
+    """Keep one bot per browser session, bounded by size and idle time
+
+    Sessions are created lazily on first access. Sessions idle for longer
+    than `ttl_seconds` are dropped, and once `max_sessions` is reached the
+    least recently used session is evicted to make room for a new one.
+    """
+
+    def __init__(self, factory: Callable[[], Any], max_sessions: int = 50, ttl_seconds: float = 1800):
+        if max_sessions < 1:
+            raise ValueError("max_sessions must be at least 1")
+        self.factory = factory
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+
+        # session_id -> (last_access, bot), oldest access first
+        self._sessions: "OrderedDict[str, list]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.created = 0
+        self.expired = 0
+        self.evicted = 0
+
+    def get(self, session_id: str) -> Any:
+        """Return the bot for a session, creating it if needed"""
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            entry = self._sessions.get(session_id)
+            if entry is not None:
+                entry[0] = now
+                self._sessions.move_to_end(session_id)
+                return entry[1]
+
+        # Build the bot outside the lock so slow construction doesn't block other sessions
+        bot = self.factory()
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is not None:
+                # Another request for the same session won the race
+                entry[0] = now
+                self._sessions.move_to_end(session_id)
+                return entry[1]
+            while len(self._sessions) >= self.max_sessions:
+                self._sessions.popitem(last=False)
+                self.evicted += 1
+            self._sessions[session_id] = [now, bot]
+            self.created += 1
+        return bot
+
+    def discard(self, session_id: str) -> None:
+        """Drop a session, e.g. when its browser tab is closed"""
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def _expire(self, now: float) -> None:
+        """Drop sessions idle for longer than the TTL (caller holds the lock)"""
+        while self._sessions:
+            session_id, (last_access, _) = next(iter(self._sessions.items()))
+            if now - last_access < self.ttl_seconds:
+                break
+            self._sessions.popitem(last=False)
+            self.expired += 1
+
+    def stats(self) -> Dict[str, int]:
+        """Return pool occupancy and lifetime counters"""
+        with self._lock:
+            self._expire(time.monotonic())
+            return {
+                "active": len(self._sessions),
+                "max_sessions": self.max_sessions,
+                "created": self.created,
+                "expired": self.expired,
+                "evicted": self.evicted,
+            }
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._sessions)
@@ -0,0 +1,131 @@
+"""
+Schema-shaped model output with a tolerant fallback
+
+StructuredCaller asks the model for output through tool calling
+(`with_structured_output(..., include_raw=True)`), so a well-behaved reply
+is parsed without any extra round trip. When the tool call is missing or
+malformed, the JSON is recovered from the raw reply instead (code fences,
+surrounding prose and trailing text are skipped), and only if that also
+fails is the call retried.
+"""
+import json
+import threading
+from typing import Any, Dict, Optional, Tuple, Type
+
+from langchain_core.messages import BaseMessage
+from pydantic import BaseModel, ValidationError
+
+from .metrics import stage_config
+
+_decoder = json.JSONDecoder()
+
+
+def extract_json(text: str) -> Optional[Any]:
+    """Return the first JSON object found in text, or None
+
+    Tries every `{` in turn and decodes from there, so prose, markdown code
+    fences and anything after the object are ignored.
+    """
+    start = text.find("{")
+    while start != -1:
+        try:
+            value, _ = _decoder.raw_decode(text, start)
+            return value
+        except ValueError:
+            start = text.find("{", start + 1)
+    return None
+
+
+def message_text(message: BaseMessage) -> str:
+    """Plain text of a message whose content may be a list of blocks"""
+    content = message.content
+    if isinstance(content, str):
+        return content
+    return "".join(
+        block.get("text", "") if isinstance(block, dict) else str(block)
+        for block in content
+    )
+
+
+def _add_usage(total: Optional[Dict[str, Any]], usage: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    if not usage:
+        return total
+    if total is None:
+        return dict(usage)
+    merged = dict(total)
+    for key in ("input_tokens", "output_tokens", "total_tokens"):
+        merged[key] = merged.get(key, 0) + usage.get(key, 0)
+    details = dict(merged.get("input_token_details") or {})
+    for key, value in (usage.get("input_token_details") or {}).items():
+        details[key] = (details.get(key) or 0) + (value or 0)
+    merged["input_token_details"] = details
+    return merged
+
+
+class StructuredOutputError(ValueError):
+    """The model's reply could not be parsed into the schema, even after retrying"""
+
+
+class StructuredCaller:
+    """Invoke prompts for schema-validated dicts and count how each was parsed
+
+    Per stage it records calls, replies parsed from the tool call
+    ("structured"), replies recovered from raw text ("recovered"), replies
+    that could not be parsed at all ("failures") and retries.
+    """
+
+    def __init__(self, max_retries: int = 1):
+        self.max_retries = max_retries
+        self.stages: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    def _count(self, stage: str, key: str) -> None:
+        with self._lock:
+            entry = self.stages.setdefault(stage, {"calls": 0, "structured": 0, "recovered": 0, "failures": 0, "retries": 0})
+            entry[key] += 1
+
+    def _recover(self, raw: BaseMessage, schema: Type[BaseModel]) -> Optional[BaseModel]:
+        candidates = [call.get("args") for call in getattr(raw, "tool_calls", None) or []]
+        candidates.append(extract_json(message_text(raw)))
+        for candidate in candidates:
+            if isinstance(candidate, dict):
+                try:
+                    return schema.model_validate(candidate)
+                except ValidationError:
+                    continue
+        return None
+
+    def invoke(self, stage: str, prompt, llm, schema: Type[BaseModel], inputs: Dict[str, Any]) -> Tuple[Dict[str, Any], Optional[Dict[str, Any]]]:
+        """Return the parsed reply as a dict plus the token usage of every attempt"""
+        chain = prompt | llm.with_structured_output(schema, include_raw=True)
+        self._count(stage, "calls")
+        usage = None
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                self._count(stage, "retries")
+            result = chain.invoke(inputs, config=stage_config(stage))
+            raw = result["raw"]
+            usage = _add_usage(usage, getattr(raw, "usage_metadata", None))
+
+            parsed = result.get("parsed")
+            if isinstance(parsed, schema):
+                self._count(stage, "structured")
+                return parsed.model_dump(), usage
+            parsed = self._recover(raw, schema)
+            if parsed is not None:
+                self._count(stage, "recovered")
+                return parsed.model_dump(), usage
+            self._count(stage, "failures")
+            print(f"[{stage}] could not parse model output (attempt {attempt + 1}): {message_text(raw)[:200]!r}")
+        raise StructuredOutputError(f"{stage}: no valid {schema.__name__} after {self.max_retries + 1} attempts")
+
+    def report(self) -> str:
+        """Table of how each stage's replies were parsed"""
+        lines = [f"{'stage':<32} {'calls':>5} {'tool':>5} {'text':>5} {'fail':>5} {'retry':>5}"]
+        with self._lock:
+            for stage, entry in self.stages.items():
+                lines.append(
+                    f"{stage:<32} {entry['calls']:>5} {entry['structured']:>5} {entry['recovered']:>5} "
+                    f"{entry['failures']:>5} {entry['retries']:>5}"
+                )
+        return "\n".join(lines)
@@ -0,0 +1,176 @@
+"""
+On-disk store of extracted PDF text
+
+Each document is kept as two files named after its key: `<key>.txt` holds
+the UTF-8 text of all pages back to back, and `<key>.idx` holds the byte
+offset where each page starts (plus the end offset). A page range is
+served by memory-mapping the text file and decoding only that slice, so
+nothing has to be re-parsed with pypdf.
+
+Prune the store from the command line:
+    python -m bot_src.text_store prune --max-age-days 30 --max-mb 500
+"""
+import argparse
+import hashlib
+import importlib.metadata
+import mmap
+import os
+import tempfile
+import time
+from array import array
+from typing import Dict, List, Optional
+
+# Read from package metadata, so using the store does not import pypdf itself
+PYPDF_VERSION = importlib.metadata.version("pypdf")
+
+
+class TextStore:
+    """Extracted-text cache keyed by file hash and pypdf version"""
+
+    def __init__(self, directory: str = "_cache/text"):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(file_sha256: str) -> str:
+        # Different pypdf versions can extract different text from the same file
+        return hashlib.sha256(f"{file_sha256}\0pypdf-{PYPDF_VERSION}".encode("utf-8")).hexdigest()
+
+    def _paths(self, key: str):
+        base = os.path.join(self.directory, key)
+        return base + ".txt", base + ".idx"
+
+    def get_pages(self, key: str, first_page: int = 1, last_page: Optional[int] = None) -> Optional[List[str]]:
+        """Return page texts for an inclusive 1-based range, or None if not stored"""
+        text_path, index_path = self._paths(key)
+        try:
+            offsets = array("Q")
+            with open(index_path, "rb") as f:
+                offsets.frombytes(f.read())
+            page_count = len(offsets) - 1
+            first = max(first_page, 1)
+            last = page_count if last_page is None else min(last_page, page_count)
+
+            with open(text_path, "rb") as f:
+                if offsets[-1] == 0:
+                    # mmap cannot map an empty file
+                    pages = ["" for _ in range(first, last + 1)]
+                else:
+                    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                        pages = [
+                            data[offsets[i - 1]:offsets[i]].decode("utf-8")
+                            for i in range(first, last + 1)
+                        ]
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+
+        # Record the access so pruning can drop the least recently used documents
+        now = time.time()
+        try:
+            os.utime(index_path, (now, now))
+        except FileNotFoundError:
+            # Pruned while we were reading it
+            self.misses += 1
+            return None
+        self.hits += 1
+        return pages
+
+    def put(self, key: str, pages: List[str]) -> None:
+        """Store the text of every page of a document"""
+        text_path, index_path = self._paths(key)
+        offsets = array("Q", [0])
+        encoded = []
+        for page in pages:
+            data = page.encode("utf-8")
+            encoded.append(data)
+            offsets.append(offsets[-1] + len(data))
+
+        # Write to temporary files and rename, text first: a document only
+        # becomes visible once its index exists, and is never half-written
+        self._write_atomic(text_path, b"".join(encoded))
+        self._write_atomic(index_path, offsets.tobytes())
+
+    def _write_atomic(self, path: str, data: bytes) -> None:
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def _documents(self) -> List[Dict]:
+        documents = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".idx"):
+                continue
+            key = name[:-4]
+            text_path, index_path = self._paths(key)
+            try:
+                size = os.path.getsize(index_path) + os.path.getsize(text_path)
+                last_access = os.path.getmtime(index_path)
+            except FileNotFoundError:
+                continue
+            documents.append({"key": key, "size": size, "last_access": last_access})
+        return documents
+
+    def remove(self, key: str) -> None:
+        for path in reversed(self._paths(key)):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def prune(self, max_age_days: Optional[float] = None, max_bytes: Optional[int] = None) -> int:
+        """Remove documents unused for `max_age_days`, then least recently used ones over `max_bytes`"""
+        documents = sorted(self._documents(), key=lambda d: d["last_access"])
+        removed = 0
+        if max_age_days is not None:
+            cutoff = time.time() - max_age_days * 86400
+            while documents and documents[0]["last_access"] < cutoff:
+                self.remove(documents.pop(0)["key"])
+                removed += 1
+        if max_bytes is not None:
+            total = sum(d["size"] for d in documents)
+            while documents and total > max_bytes:
+                document = documents.pop(0)
+                self.remove(document["key"])
+                total -= document["size"]
+                removed += 1
+        return removed
+
+    def stats(self) -> Dict[str, int]:
+        documents = self._documents()
+        return {
+            "documents": len(documents),
+            "bytes": sum(d["size"] for d in documents),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the extracted PDF text store")
+    parser.add_argument("--dir", default=os.getenv("PDF_TEXT_STORE_DIR", "_cache/text"), help="store directory")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    prune_parser = commands.add_parser("prune", help="remove old or excess documents")
+    prune_parser.add_argument("--max-age-days", type=float, help="remove documents not read for this many days")
+    prune_parser.add_argument("--max-mb", type=float, help="then shrink the store to this many megabytes")
+    commands.add_parser("stats", help="show document count and size")
+
+    args = parser.parse_args()
+    store = TextStore(args.dir)
+    if args.command == "prune":
+        max_bytes = None if args.max_mb is None else int(args.max_mb * 1024 * 1024)
+        removed = store.prune(max_age_days=args.max_age_days, max_bytes=max_bytes)
+        print(f"Removed {removed} documents")
+    stats = store.stats()
+    print(f"{stats['documents']} documents, {stats['bytes'] / 1024 / 1024:.1f} MB in {args.dir}")
+
+
+if __name__ == "__main__":
+    main()
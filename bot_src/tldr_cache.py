@@ -0,0 +1,80 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional
+
+
+class TLDRCache:
+    """Persistent TLDR store keyed by PDF content, model and prompt version
+
+    Entries live in a SQLite database so they survive restarts and can be
+    shared by several worker processes. When the stored summaries exceed
+    `max_bytes`, the least recently used entries are evicted.
+    """
+
+    def __init__(self, path: str = "_cache/tldr.sqlite3", max_bytes: int = 50 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS tldr ("
+            " key TEXT PRIMARY KEY,"
+            " tldr TEXT NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " created REAL NOT NULL,"
+            " last_access REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(pdf_sha256: str, model: str, prompt_version: str) -> str:
+        return hashlib.sha256(f"{pdf_sha256}\0{model}\0{prompt_version}".encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached TLDR, or None on a miss"""
+        with self._lock:
+            row = self._conn.execute("SELECT tldr FROM tldr WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE tldr SET last_access = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, key: str, tldr: str) -> None:
+        """Store a TLDR and evict old entries if over the size limit"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO tldr (key, tldr, size, created, last_access) VALUES (?, ?, ?, ?, ?)",
+                (key, tldr, len(tldr.encode("utf-8")), now, now)
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self) -> None:
+        """Drop least recently used entries until under max_bytes (caller holds the lock)"""
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM tldr").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self._conn.execute("SELECT key, size FROM tldr ORDER BY last_access").fetchall():
+            if total <= self.max_bytes:
+                break
+            self._conn.execute("DELETE FROM tldr WHERE key = ?", (key,))
+            total -= size
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            entries, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM tldr").fetchone()
+            return {"hits": self.hits, "misses": self.misses, "entries": entries, "bytes": size}
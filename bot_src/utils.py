@@ -1,15 +1,170 @@
 import os
 import datetime
-from pypdf import PdfReader
-from typing import List, Dict
+import hashlib
+import threading
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import List, Dict, Iterator, Optional, Tuple
 
-def read_pdf(file_path: str) -> str:
-    """Read and extract text from PDF file"""
+from .text_store import TextStore
+
+def iter_pdf_pages(
+    file_path: str,
+    first_page: int = 1,
+    last_page: Optional[int] = None
+) -> Iterator[Tuple[int, str]]:
+    """Yield (page number, text) for each page of a PDF file
+    
+    Page numbers are 1-based and the range is inclusive; by default every
+    page is read. Pages are extracted one at a time, so callers can start
+    working on the first page before the last one is parsed.
+    """
+    from pypdf import PdfReader
+    
     reader = PdfReader(file_path)
-    text = ""
-    for page in reader.pages:
-        text += page.extract_text()
-    return text
+    last_page = len(reader.pages) if last_page is None else min(last_page, len(reader.pages))
+    for page_number in range(max(first_page, 1), last_page + 1):
+        yield page_number, reader.pages[page_number - 1].extract_text() or ""
+
+def pdf_page_count(file_path: str) -> int:
+    """Return the number of pages in a PDF file"""
+    from pypdf import PdfReader
+    
+    return len(PdfReader(file_path).pages)
+
+def _extract_page_range(args: Tuple[str, int, int]) -> List[str]:
+    """Worker: extract an inclusive page range with its own PdfReader"""
+    file_path, first_page, last_page = args
+    return [text for _, text in iter_pdf_pages(file_path, first_page, last_page)]
+
+_process_pool: Optional[ProcessPoolExecutor] = None
+_process_pool_workers = 0
+_process_pool_lock = threading.Lock()
+
+def _get_process_pool(workers: int) -> ProcessPoolExecutor:
+    """Return a shared process pool, so worker start-up is paid once"""
+    global _process_pool, _process_pool_workers
+    with _process_pool_lock:
+        if _process_pool is None or _process_pool_workers != workers:
+            if _process_pool is not None:
+                _process_pool.shutdown(wait=False)
+            # The app creates the pool from a worker thread of a threaded
+            # server; forking such a process can deadlock the child
+            _process_pool = ProcessPoolExecutor(
+                max_workers=workers, mp_context=multiprocessing.get_context("forkserver")
+            )
+            _process_pool_workers = workers
+        return _process_pool
+
+def _discard_process_pool(pool: ProcessPoolExecutor):
+    """Drop a broken pool so the next call starts a new one"""
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is pool:
+            _process_pool = None
+    pool.shutdown(wait=False)
+
+_text_store: Optional[TextStore] = None
+
+def set_text_store(store: Optional[TextStore]):
+    """Use an on-disk store of extracted text for read_pdf/read_pdf_pages (None disables it)"""
+    global _text_store
+    _text_store = store
+
+def read_pdf_pages(
+    file_path: str,
+    first_page: int = 1,
+    last_page: Optional[int] = None,
+    workers: int = 1,
+    min_parallel_pages: int = 40,
+    digest: Optional[str] = None
+) -> List[str]:
+    """Read PDF file and return the extracted text of each page
+    
+    With `workers` > 1, documents of at least `min_parallel_pages` pages
+    are split into contiguous page ranges that are extracted in separate
+    processes and reassembled in page order. Smaller documents are read
+    serially, where process start-up would cost more than it saves.
+    
+    If a text store is configured (see set_text_store), previously
+    extracted documents are served from it without re-parsing, and whole
+    documents extracted here are added to it. Pass the file's `digest`
+    (file_sha256) if it is already known, to avoid hashing it again.
+    """
+    store = _text_store
+    if store is None:
+        return _extract_pages(file_path, first_page, last_page, workers, min_parallel_pages)
+    
+    key = store.make_key(digest or file_sha256(file_path))
+    pages = store.get_pages(key, first_page, last_page)
+    if pages is not None:
+        return pages
+    if first_page > 1 or last_page is not None:
+        return _extract_pages(file_path, first_page, last_page, workers, min_parallel_pages)
+    pages = _extract_pages(file_path, 1, None, workers, min_parallel_pages)
+    store.put(key, pages)
+    return pages
+
+def _extract_pages(
+    file_path: str,
+    first_page: int,
+    last_page: Optional[int],
+    workers: int,
+    min_parallel_pages: int
+) -> List[str]:
+    """Extract page texts with pypdf, serially or across a process pool"""
+    from .metrics import get_metrics
+    
+    start = time.perf_counter()
+    pages = _parse_pages(file_path, first_page, last_page, workers, min_parallel_pages)
+    get_metrics().observe_stage("pdf_extraction", time.perf_counter() - start)
+    return pages
+
+def _parse_pages(
+    file_path: str,
+    first_page: int,
+    last_page: Optional[int],
+    workers: int,
+    min_parallel_pages: int
+) -> List[str]:
+    if workers > 1:
+        page_count = pdf_page_count(file_path)
+        last = page_count if last_page is None else min(last_page, page_count)
+        first = max(first_page, 1)
+        n_pages = last - first + 1
+        if n_pages >= min_parallel_pages:
+            # A few shards per worker evens out pages that are slower to parse
+            n_shards = min(n_pages, workers * 4)
+            bounds = [first + n_pages * i // n_shards for i in range(n_shards + 1)]
+            shards = [(file_path, bounds[i], bounds[i + 1] - 1) for i in range(n_shards)]
+            pool = _get_process_pool(workers)
+            try:
+                return [text for shard in pool.map(_extract_page_range, shards) for text in shard]
+            except BrokenProcessPool as e:
+                # A worker died (e.g. killed for memory); extract this one serially
+                print(f"PDF process pool broke ({e}); extracting {file_path} serially")
+                _discard_process_pool(pool)
+    return [text for _, text in iter_pdf_pages(file_path, first_page, last_page)]
+
+def read_pdf(
+    file_path: str,
+    first_page: int = 1,
+    last_page: Optional[int] = None,
+    workers: int = 1,
+    min_parallel_pages: int = 40
+) -> str:
+    """Read and extract text from PDF file"""
+    return "".join(read_pdf_pages(file_path, first_page, last_page, workers, min_parallel_pages))
+
+def file_sha256(file_path: str) -> str:
+    """Return the SHA-256 hex digest of a file's bytes"""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
 
 def save_chat_history(file_name: str, chat_history: List[Dict[str, str]]) -> str:
     """Save chat history to markdown file"""
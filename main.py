@@ -1,45 +1,127 @@
+import asyncio
+import threading
 import gradio as gr
-from bot_src.bot import CuriousPeerBot
-from bot_src.utils import read_pdf, save_chat_history
+from bot_src.bot import CuriousPeerBot, preload_model_client
+from bot_src.utils import read_pdf_pages, save_chat_history, file_sha256, set_text_store
+from bot_src.text_store import TextStore
+from bot_src.sessions import SessionPool
+from bot_src.tldr_cache import TLDRCache
+from bot_src.metrics import get_metrics
+from starlette.requests import Request
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
 import os
+from functools import partial
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
-# Initialize bot
-bot = CuriousPeerBot()
+# One bot per browser session, so users don't share chat history
+sessions = SessionPool(
+    partial(
+        CuriousPeerBot,
+        history_token_budget=int(os.getenv("HISTORY_TOKEN_BUDGET", "8000")),
+        keep_recent_turns=int(os.getenv("HISTORY_KEEP_RECENT_TURNS", "4"))
+    ),
+    max_sessions=int(os.getenv("MAX_SESSIONS", "50")),
+    ttl_seconds=float(os.getenv("SESSION_TTL_SECONDS", "1800"))
+)
 
-def process_file(file):
+# Large PDFs are extracted across several processes
+pdf_workers = int(os.getenv("PDF_WORKERS", str(os.cpu_count() or 1)))
+pdf_parallel_min_pages = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "40"))
+
+# Extracted text is kept on disk, so re-uploads skip PDF parsing entirely
+set_text_store(TextStore(os.getenv("PDF_TEXT_STORE_DIR", "_cache/text")))
+
+# TLDRs are shared across sessions: the same assigned paper is uploaded many times
+tldr_cache = TLDRCache(
+    os.getenv("TLDR_CACHE_PATH", "_cache/tldr.sqlite3"),
+    max_bytes=int(os.getenv("TLDR_CACHE_MAX_BYTES", str(50 * 1024 * 1024)))
+)
+
+# Session pool occupancy and TLDR cache hits are served at /metrics
+metrics = get_metrics()
+metrics.add_collector(
+    "sessions_active", "gauge", "Browser sessions holding a bot",
+    lambda: {(): sessions.stats()["active"]}
+)
+metrics.add_collector(
+    "sessions_max", "gauge", "Session pool capacity",
+    lambda: {(): sessions.max_sessions}
+)
+metrics.add_collector(
+    "sessions_total", "counter", "Sessions created, expired and evicted",
+    lambda: {(("event", event),): value for event, value in sessions.stats().items() if event in ("created", "expired", "evicted")}
+)
+metrics.add_collector(
+    "tldr_cache_lookups_total", "counter", "TLDR cache lookups by result",
+    lambda: {(("result", "hit"),): tldr_cache.hits, (("result", "miss"),): tldr_cache.misses}
+)
+
+def metrics_endpoint(request: Request) -> PlainTextResponse:
+    """Per-stage latency, token and cost histograms for Prometheus to scrape"""
+    return PlainTextResponse(get_metrics().render(), media_type="text/plain; version=0.0.4")
+
+def get_bot(request: gr.Request) -> CuriousPeerBot:
+    """Return the bot for the requesting browser session"""
+    session_id = request.session_hash if request and request.session_hash else "default"
+    return sessions.get(session_id)
+
+def close_session(request: gr.Request):
+    """Release the bot when the browser tab is closed"""
+    if request and request.session_hash:
+        sessions.discard(request.session_hash)
+
+async def process_file(file, request: gr.Request):
     """Process uploaded PDF file"""
     if file is None:
         return "Please upload a PDF file."
     
+    bot = get_bot(request)
     filename = os.path.basename(file.name)
     bot.set_current_file(filename)
 
-    text = read_pdf(file.name)
-    tldr = bot.generate_tldr(text)
+    # Hashing and PDF parsing are CPU-bound, keep them off the event loop;
+    # the digest keys both the text store and the TLDR cache
+    digest = await asyncio.to_thread(file_sha256, file.name)
+    pages = await asyncio.to_thread(
+        read_pdf_pages, file.name, workers=pdf_workers, min_parallel_pages=pdf_parallel_min_pages, digest=digest
+    )
+    text = "".join(pages)
+    # Chunking and indexing a long paper is CPU-bound too
+    await asyncio.to_thread(bot.set_article, text, pages)
+    
+    cache_key = TLDRCache.make_key(digest, bot.model_name, bot.TLDR_PROMPT_VERSION)
+    tldr = await asyncio.to_thread(tldr_cache.get, cache_key)
+    if tldr is None:
+        tldr = await bot.agenerate_tldr(text)
+        await asyncio.to_thread(tldr_cache.put, cache_key, tldr)
     return f"TLDR of {filename}:\n\n{tldr}"
 
-def chat(message, history):
-    """Handle chat interaction"""
-    bot_response = bot.chat(message)
+async def chat(message, history, request: gr.Request):
+    """Handle chat interaction, streaming the response as it is generated"""
+    bot = get_bot(request)
     
     # messages 형식으로 변환
     if history is None:
         history = []
     history.append({"role": "user", "content": message})
-    history.append({"role": "assistant", "content": bot_response})
+    history.append({"role": "assistant", "content": ""})
+    yield "", history
     
-    return "", history
+    async for chunk in bot.astream_chat(message):
+        history[-1]["content"] += chunk
+        yield "", history
 
-def save_history():
+async def save_history(request: gr.Request):
     """Save chat history"""
+    bot = get_bot(request)
     if not bot.get_chat_history():
         return "No chat history to save."
     
-    output_file = save_chat_history(bot.current_file, bot.get_chat_history())
+    output_file = await asyncio.to_thread(save_chat_history, bot.current_file, bot.get_chat_history())
     return f"Chat history saved to: {output_file}"
 
 # Create Gradio interface
@@ -110,10 +192,20 @@ with gr.Blocks(
         fn=save_history,
         outputs=[save_status]
     )
+    
+    interface.unload(close_session)
+
+# Async handlers wait on the network without holding a worker thread,
+# so the number of in-flight events per handler can be much higher
+interface.queue(default_concurrency_limit=int(os.getenv("CONCURRENCY_LIMIT", "64")))
 
 if __name__ == "__main__":
+    # Bots create their model client lazily; import the SDK while the server starts
+    threading.Thread(target=preload_model_client, daemon=True).start()
+    # GRADIO_SHARE=0 serves only locally, e.g. for offline load tests
     interface.launch(
-        server_port=7860,
-        share=True,
-        debug=True
+        server_port=int(os.getenv("GRADIO_SERVER_PORT", "7860")),
+        share=os.getenv("GRADIO_SHARE", "1") == "1",
+        debug=True,
+        app_kwargs={"routes": [Route("/metrics", metrics_endpoint)]}
     )
\ No newline at end of file